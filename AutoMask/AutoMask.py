@@ -720,22 +720,15 @@ class AutoMaskWidget(ScriptedLoadableModuleWidget):
     # Get erase mask segment as numpy array
     eraseArray = slicer.util.arrayFromSegmentBinaryLabelmap(segmentationNode, eraseId, volumeNode)
 
-    # # startOfEraseMask = 0
-    # # endOfEraseMask = startOfEraseMask
-    slices = eraseArray.shape[0]
-    row = eraseArray.shape[1]
-    col = eraseArray.shape[2]
+    # voxels covered by the erase mask, shared by all segments
+    eraseMask = eraseArray != 0
 
     idx = 0
     for segmentArray in segmentArrays:
       segmentationNode.GetSegmentation().AddSegment(segments[idx], segmentIds[idx])
 
-      # Iterate through voxels
-      for i in range(slices):
-        for j in range(row):
-          for k in range(col):
-            if(eraseArray[i, j, k]):
-              segmentArray[i, j, k] = 0
+      # clear every voxel covered by the erase mask at once
+      segmentArray[eraseMask] = 0
 
       # Convert back to label map array
       slicer.util.updateSegmentBinaryLabelmapFromArray(segmentArray, segmentationNode, segmentIds[idx], volumeNode)
@@ -773,11 +766,13 @@ class AutoMaskWidget(ScriptedLoadableModuleWidget):
 
       #check if preset intensity units exist
       check = True
-      if "Lower" in inputVolumeNode.__dict__.keys():
-        self.lowerThresholdText.setValue(inputVolumeNode.__dict__["Lower"])
+      lower = inputVolumeNode.GetAttribute("BAM.Lower")
+      if lower is not None:
+        self.lowerThresholdText.setValue(int(lower))
         check = False
-      if "Upper" in inputVolumeNode.__dict__.keys():
-        self.upperThresholdText.setValue(inputVolumeNode.__dict__["Upper"])
+      upper = inputVolumeNode.GetAttribute("BAM.Upper")
+      if upper is not None:
+        self.upperThresholdText.setValue(int(upper))
         check = False
 
       #check intensity units and display warning if not in HU
@@ -788,11 +783,6 @@ Default thresholds are set in HU and will not generate an accurate result.
 Change the lower and upper thresholds before initializing."""
           slicer.util.warningDisplay(text, windowTitle='Intensity Unit Warning')
 
-      #remove existing loggers
-      if self.logger.hasHandlers():
-        for handler in self.logger.handlers:
-          self.logger.removeHandler(handler)
-
       #initialize logger with filename
       try:
         filename = inputVolumeNode.GetStorageNode().GetFullNameFromFileName()
@@ -801,10 +791,15 @@ Change the lower and upper thresholds before initializing."""
         print(filename)
       except:
         filename = 'share/' + inputVolumeNode.GetName() + '.'
-      logHandler = logging.FileHandler(filename)
 
-      self.logger.addHandler(logHandler)
-      self.logger.info("Using Automatic Mask Module with " + inputVolumeNode.GetName() + "\n")
+      #keep the handler if it already writes to this file, otherwise close and replace the old ones
+      logFilenames = {getattr(handler, 'baseFilename', None) for handler in self.logger.handlers}
+      if os.path.abspath(filename) not in logFilenames:
+        for handler in list(self.logger.handlers):
+          self.logger.removeHandler(handler)
+          handler.close()
+        self.logger.addHandler(logging.FileHandler(filename, delay=True))
+        self.logger.info("Using Automatic Mask Module with " + inputVolumeNode.GetName() + "\n")
 
     else:
       self.outputVolumeSelector.baseName = "MASK"
@@ -881,8 +876,8 @@ For images with completely dark regions, use the 'Max Entropy' or 'Yen' Threshol
     self.enableAutoMaskWidgets()
 
     # store thresholds
-    inputVolumeNode.__dict__["Lower"] = self.lowerThresholdText.value
-    inputVolumeNode.__dict__["Upper"] = self.upperThresholdText.value
+    inputVolumeNode.SetAttribute("BAM.Lower", str(self.lowerThresholdText.value))
+    inputVolumeNode.SetAttribute("BAM.Upper", str(self.upperThresholdText.value))
     self.logger.info("Finished\n")
 
   def onInitButton3(self):
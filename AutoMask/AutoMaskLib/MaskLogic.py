@@ -48,6 +48,7 @@ class MaskLogic:
         self.dilateErodeRadius = dilateErodeRadius  # dilate/erode radius
         self._margin = self.dilateErodeRadius + 2
         self._stats_filter = sitk.LabelStatisticsImageFilter()
+        self._paste_filter = sitk.PasteImageFilter()
         self._boundingbox = ()              # bounding box of extracted image, will be reused
         self.thresh_method = None
         self.auto_thresh = False
@@ -257,7 +258,7 @@ class MaskLogic:
 
         destination_index = (margin, margin, margin)
         source_size = small_img.GetSize()
-        paste_filter = sitk.PasteImageFilter()
+        paste_filter = self._paste_filter
         paste_filter.SetDestinationIndex(destination_index)
         paste_filter.SetSourceSize(source_size)
         extract_img = paste_filter.Execute(extract_img, small_img)
@@ -441,7 +442,7 @@ class MaskLogic:
         boundingbox = self._boundingbox
         destination_index = (boundingbox[0], boundingbox[2], boundingbox[4])
         source_size = small_img.GetSize()
-        paste_filter = sitk.PasteImageFilter()
+        paste_filter = self._paste_filter
         paste_filter.SetDestinationIndex(destination_index)
         paste_filter.SetSourceSize(source_size)
         img = paste_filter.Execute(img, small_img)
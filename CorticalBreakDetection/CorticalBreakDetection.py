@@ -494,11 +494,13 @@ class CorticalBreakDetectionWidget(ScriptedLoadableModuleWidget):
 
       #check if preset intensity units exist
       check = True
-      if "Lower" in inputVolumeNode.__dict__.keys():
-        self.lowerThresholdText.setValue(inputVolumeNode.__dict__["Lower"])
+      lower = inputVolumeNode.GetAttribute("BAM.Lower")
+      if lower is not None:
+        self.lowerThresholdText.setValue(int(lower))
         check = False
-      if "Upper" in inputVolumeNode.__dict__.keys():
-        self.upperThresholdText.setValue(inputVolumeNode.__dict__["Upper"])
+      upper = inputVolumeNode.GetAttribute("BAM.Upper")
+      if upper is not None:
+        self.upperThresholdText.setValue(int(upper))
         check = False
 
       #check intensity units and display warning if not in HU
@@ -509,11 +511,6 @@ Default thresholds are set in HU and will not generate an accurate result.
 Change the lower and upper thresholds before initializing."""
           slicer.util.warningDisplay(text, windowTitle='Intensity Unit Warning')
 
-      #remove existing loggers
-      if self.logger.hasHandlers():
-        for handler in self.logger.handlers:
-          self.logger.removeHandler(handler)
-      
       #initialize logger with filename
       try:
         filename = inputVolumeNode.GetStorageNode().GetFullNameFromFileName()
@@ -522,10 +519,15 @@ Change the lower and upper thresholds before initializing."""
         print(filename)
       except:
         filename = 'share/' + inputVolumeNode.GetName() + '.'
-      logHandler = logging.FileHandler(filename)
-      
-      self.logger.addHandler(logHandler)
-      self.logger.info("Using Cortical Break Detection Module with " + inputVolumeNode.GetName() + "\n")
+
+      #keep the handler if it already writes to this file, otherwise close and replace the old ones
+      logFilenames = {getattr(handler, 'baseFilename', None) for handler in self.logger.handlers}
+      if os.path.abspath(filename) not in logFilenames:
+        for handler in list(self.logger.handlers):
+          self.logger.removeHandler(handler)
+          handler.close()
+        self.logger.addHandler(logging.FileHandler(filename, delay=True))
+        self.logger.info("Using Cortical Break Detection Module with " + inputVolumeNode.GetName() + "\n")
 
   def onSelectMask(self):
     """Run this whenever a periosteal contour/mask is selected."""
@@ -658,8 +660,8 @@ For images with completely dark regions, use the 'Max Entropy' or 'Yen' Threshol
                                          labelOpacity=0.5)
     
     # store thresholds 
-    masterVolumeNode.__dict__["Lower"] = self.lowerThresholdText.value
-    masterVolumeNode.__dict__["Upper"] = self.upperThresholdText.value
+    masterVolumeNode.SetAttribute("BAM.Lower", str(self.lowerThresholdText.value))
+    masterVolumeNode.SetAttribute("BAM.Upper", str(self.upperThresholdText.value))
                                     
     # update widgets
     self.outputCorticalBreaksSelector.setCurrentNodeID("") # reset the output volume selector
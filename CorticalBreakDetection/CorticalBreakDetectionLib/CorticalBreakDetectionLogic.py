@@ -239,6 +239,11 @@ class CorticalBreakDetectionLogic(ScriptedLoadableModuleLogic):
     Returns:
       bool: True for HU units, false for other
     '''
+    #reuse the result stored on the node unless the image data changed since
+    mtime = str(volumeNode.GetImageData().GetMTime())
+    if volumeNode.GetAttribute("BAM.HUCheckMTime") == mtime:
+      return volumeNode.GetAttribute("BAM.HUCheck") == "1"
+
     #create array and calculate statistics
     arr = slicer.util.arrayFromVolume(volumeNode)
     arr_max = np.where(arr > 4000, arr, 0)
@@ -252,4 +257,8 @@ class CorticalBreakDetectionLogic(ScriptedLoadableModuleLogic):
     #-1000 < average < 1000
     #500 < standard deviation < 1000
     #out of range values < 10% of image
-    return (arr_avg > -1000 and arr_avg < 1000 and arr_std > 500 and arr_std < 1000 and max_ratio + min_ratio < 0.1)
\ No newline at end of file
+    isHU = (arr_avg > -1000 and arr_avg < 1000 and arr_std > 500 and arr_std < 1000 and max_ratio + min_ratio < 0.1)
+
+    volumeNode.SetAttribute("BAM.HUCheck", "1" if isHU else "0")
+    volumeNode.SetAttribute("BAM.HUCheckMTime", mtime)
+    return isHU
\ No newline at end of file
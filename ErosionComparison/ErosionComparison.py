@@ -300,11 +300,6 @@ class ErosionComparisonWidget(ScriptedLoadableModuleWidget):
             self.outputImageSelector.baseName = inputVolumeNode.GetName() + '_COMPARISON'
             self.outputTableSelector.baseName = inputVolumeNode.GetName() + '_TABLE'
 
-        #remove existing loggers
-        if self.logger.hasHandlers():
-            for handler in self.logger.handlers:
-                self.logger.removeHandler(handler)
-        
         #initialize logger with filename
         try:
             filename = inputVolumeNode.GetStorageNode().GetFullNameFromFileName()
@@ -313,10 +308,15 @@ class ErosionComparisonWidget(ScriptedLoadableModuleWidget):
             print(filename)
         except:
             filename = 'share/' + inputVolumeNode.GetName() + '.'
-        logHandler = logging.FileHandler(filename)
-        
-        self.logger.addHandler(logHandler)
-        self.logger.info("Using Cortical Break Detection Module with " + inputVolumeNode.GetName() + "\n")
+
+        #keep the handler if it already writes to this file, otherwise close and replace the old ones
+        logFilenames = {getattr(handler, 'baseFilename', None) for handler in self.logger.handlers}
+        if os.path.abspath(filename) not in logFilenames:
+            for handler in list(self.logger.handlers):
+                self.logger.removeHandler(handler)
+                handler.close()
+            self.logger.addHandler(logging.FileHandler(filename, delay=True))
+            self.logger.info("Using Cortical Break Detection Module with " + inputVolumeNode.GetName() + "\n")
 
     def onCompareSeg(self) -> None:
         '''Compare erosion segmentation button pressed'''
@@ -15,6 +15,7 @@ from ErosionVolumeLib.SegmentEditor import SegmentEditor
 from ErosionVolumeLib.SegmentCopier import SegmentCopier
 from ErosionVolumeLib.MarkupsTable import MarkupsTable
 import os
+import pathlib
 
 import SimpleITK as sitk
 import sitkUtils
@@ -81,6 +82,9 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
     self._logic.progressCallBack = self.setProgress
     self._ras2ijk = vtk.vtkMatrix4x4()
     self._ijk2ras = vtk.vtkMatrix4x4()
+    self._lastShownVolumeID = None  # ID of the volume in the slice viewers
+    self._previewCache = None  # shrunk input volume from the last preview
+    self._previewSegments = None  # (output node ID, segment IDs) added by the last preview
 
     ScriptedLoadableModuleWidget.__init__(self, parent)
 
@@ -98,6 +102,12 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
     self.setupManualCorrection()
     self.setupStats()
 
+    # timer to redraw the viewer windows only after the input volume selection settles
+    self._viewerUpdateTimer = qt.QTimer()
+    self._viewerUpdateTimer.setSingleShot(True)
+    self._viewerUpdateTimer.setInterval(150)
+    self._viewerUpdateTimer.timeout.connect(self.updateSliceViewers)
+
     # Add vertical spacer
     self.layout.addStretch(1)
 
@@ -208,7 +218,7 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
     # Progress Bar
     self.progressBar = qt.QProgressBar()
     self.progressBar.hide()
-    executeGridLayout.addWidget(self.progressBar, 0, 0)
+    executeGridLayout.addWidget(self.progressBar, 0, 0, 1, 2)
 
     # Get Erosion Button
     self.getErosionsButton = qt.QPushButton("Get Erosions")
@@ -216,6 +226,13 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
     self.getErosionsButton.enabled = False
     executeGridLayout.addWidget(self.getErosionsButton, 1, 0)
 
+    # Preview Button
+    self.previewButton = qt.QPushButton("Preview")
+    self.previewButton.toolTip = ("Get erosions on the volume shrunk by 2 for a quick check of seed points, "
+                                  "the result is approximate and replaced by the next run")
+    self.previewButton.enabled = False
+    executeGridLayout.addWidget(self.previewButton, 1, 1)
+
     # Execution frame with progress bar and get button
     erosionButtonFrame = qt.QFrame()
     erosionButtonFrame.setLayout(executeGridLayout)
@@ -228,11 +245,13 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
     self.inputMaskSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.onSelectInputMask)
     self.inputMaskSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.checkErosionsButton)
     self.outputErosionSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.checkErosionsButton)
+    self.outputErosionSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.onSelectOutputErosion)
     self.outputErosionSelector.connect("nodeAddedByUser(vtkMRMLNode*)", lambda node: self.onAddOutputErosion(node))
     self.markupsTableWidget.getMarkupsSelector().connect("currentNodeChanged(vtkMRMLNode*)", self.checkErosionsButton)
     self.markupsTableWidget.getMarkupsSelector().connect("currentNodeChanged(vtkMRMLNode*)", self.onSelectSeed)
     self.glyphSizeBox.valueChanged.connect(self.onGlyphSizeChanged)
     self.getErosionsButton.connect("clicked(bool)", self.onGetErosionsButton)
+    self.previewButton.connect("clicked(bool)", self.onPreviewButton)
   
   def setupManualCorrection(self):
     """Set up widgets in step 5 manual correction"""
@@ -472,6 +491,7 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
                                      self.inputMaskSelector.currentNode() and
                                      self.outputErosionSelector.currentNode() and
                                      self.markupsTableWidget.getCurrentNode())
+    self.previewButton.enabled = self.getErosionsButton.enabled
 
   def onSelect4(self):
     """Update the state of the get erosions button whenever the selectors in step 4 change"""
@@ -479,6 +499,7 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
                                      self.inputMaskSelector.currentNode() and
                                      self.outputErosionSelector.currentNode() and
                                      self.markupsTableWidget.getCurrentNode())
+    self.previewButton.enabled = self.getErosionsButton.enabled
 
   def onSelect5(self):
     """Update the state of the import/export button whenever the selectors in step 5 change"""
@@ -505,35 +526,44 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
       inputVolumeNode.GetIJKToRASMatrix(self._ijk2ras)
       
       self.markupsTableWidget.setCoordsMatrices(self._ras2ijk, self._ijk2ras)
-      # update the viewer windows
-      slicer.util.setSliceViewerLayers(background=inputVolumeNode)
-      slicer.util.resetSliceViews() # centre the volume in the viewer windows
+      # update the viewer windows once the selection settles
+      self._viewerUpdateTimer.start()
 
       #Set master volume in statistics step
       self.masterVolumeSelector.setCurrentNode(inputVolumeNode)
       self.voxelSizeText.value = inputVolumeNode.GetSpacing()[0]
 
-      #remove existing loggers
-      if self.logger.hasHandlers():
-        for handler in self.logger.handlers:
-          self.logger.removeHandler(handler)
-          
-       #initialize logger with filename
-      try:
-        filename = inputVolumeNode.GetStorageNode().GetFullNameFromFileName()
-        filename = os.path.split(filename)[0] + '/LOG_' + os.path.split(filename)[1]
-        filename = os.path.splitext(filename)[0] + '.log'
-        print(filename)
-      except:
-        filename = 'share/' + inputVolumeNode.GetName() + '.'
-      logHandler = logging.FileHandler(filename)
-      
-      self.logger.addHandler(logHandler)
-      self.logger.info("Using Erosion Volume Module with " + inputVolumeNode.GetName() + "\n")
-
       #set name in statistics
       self.masterVolumeSelector.baseName = inputVolumeNode.GetName()
-      
+
+  def updateSliceViewers(self):
+    """Show the selected input volume in the viewer windows, unless it is already shown"""
+    inputVolumeNode = self.inputVolumeSelector.currentNode()
+    if inputVolumeNode and inputVolumeNode.GetID() != self._lastShownVolumeID:
+      slicer.util.setSliceViewerLayers(background=inputVolumeNode)
+      slicer.util.resetSliceViews() # centre the volume in the viewer windows
+      self._lastShownVolumeID = inputVolumeNode.GetID()
+
+  def setLogFile(self, inputVolumeNode):
+    """Log to a file next to the input volume, only done once erosions are computed"""
+    #initialize logger with filename
+    try:
+      volumePath = pathlib.Path(inputVolumeNode.GetStorageNode().GetFullNameFromFileName())
+      filename = str(volumePath.with_name('LOG_' + volumePath.stem + '.log'))
+      print(filename)
+    except:
+      filename = 'share/' + inputVolumeNode.GetName() + '.'
+
+    # the logger is shared with other modules, so check the handlers it actually has
+    logFilenames = {getattr(handler, 'baseFilename', None) for handler in self.logger.handlers}
+    if os.path.abspath(filename) not in logFilenames:
+      #remove and close existing loggers, iterating over a copy of the list
+      for handler in list(self.logger.handlers):
+        self.logger.removeHandler(handler)
+        handler.close()
+      self.logger.addHandler(logging.FileHandler(filename, delay=True))
+      self.logger.info("Using Erosion Volume Module with " + inputVolumeNode.GetName() + "\n")
+
 
   def onSelectInputMask(self):
     """Run this whenever the input Mask selector in step 4 changes"""
@@ -560,6 +590,14 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
     if not index_str.isdigit(): # not postfixed with '_' plus an index
       node.SetName(slicer.mrmlScene.GenerateUniqueName(baseName))
 
+  def onSelectOutputErosion(self):
+    """Run this whenever the output erosion selector in step 4 changes"""
+    # a preview is only replaced while its output stays selected
+    outputVolumeNode = self.outputErosionSelector.currentNode()
+    if (self._previewSegments and 
+        (outputVolumeNode is None or outputVolumeNode.GetID() != self._previewSegments[0])):
+      self._previewSegments = None
+
   def onSelectSeed(self):
     """Run this whenever the seed point selector in step 4 changes"""
     self.markupsTableWidget.onMarkupsNodeChanged()
@@ -582,6 +620,20 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
 
   def onGetErosionsButton(self):
     """Run this whenever the get erosions button in step 4 is clicked"""
+    self.getErosions()
+
+  def onPreviewButton(self):
+    """Run this whenever the preview button in step 4 is clicked"""
+    self.getErosions(shrinkFactor=2)
+
+  def getErosions(self, shrinkFactor=1):
+    """
+    Get the erosions and add them to the output erosion node.
+
+    Args:
+      shrinkFactor (int): run on the volume shrunk by this factor along each axis,
+        values above 1 give a preview that is replaced by the next run.
+    """
     # update widgets
     self.disableErosionsWidgets()
     # self.markupsTableWidget.updateLabels()
@@ -594,12 +646,34 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
     # minimalRadius = self.markupsTableWidget.getCurrentNodeMinimalRadii()
     # dilateErodeDistance = self.markupsTableWidget.getCurrentNodeDilateErodeDistances()
 
-    self.logger.info("Erosion Volume initialized with parameters:")
-    self.logger.info("Input Volume: " + inputVolumeNode.GetName())
-    self.logger.info("Input Mask: " + inputMaskNode.GetName())
-    self.logger.info("Output Volume: " + outputVolumeNode.GetName())
+    self.setLogFile(inputVolumeNode)
+    # one record for all parameters instead of one per line
+    self.logger.info("\n".join(["Erosion Volume initialized with parameters:",
+                                "Input Volume: " + inputVolumeNode.GetName(),
+                                "Input Mask: " + inputMaskNode.GetName(),
+                                "Output Volume: " + outputVolumeNode.GetName()]
+                               + (["Preview Shrink Factor: " + str(shrinkFactor)] if shrinkFactor > 1 else [])))
+
+    if shrinkFactor > 1:
+      # keep the shrunk volume so previews with other seeds or parameters skip the pull
+      volumeKey = (inputVolumeNode.GetID(), inputVolumeNode.GetImageData().GetMTime(), shrinkFactor)
+      if self._previewCache is None or self._previewCache[0] != volumeKey:
+        full_img = sitkUtils.PullVolumeFromSlicer(inputVolumeNode.GetName())
+        full_geometry = (full_img.GetSize(), full_img.GetOrigin(), 
+                         full_img.GetSpacing(), full_img.GetDirection())
+        self._previewCache = (volumeKey, sitk.Shrink(full_img, [shrinkFactor]*3), full_geometry)
+      img, full_geometry = self._previewCache[1:]
+    else:
+      img = sitkUtils.PullVolumeFromSlicer(inputVolumeNode.GetName())
+
+    # sizes below are in voxels, on a shrunk volume they are scaled down
+    #  to cover about the same physical distance as the full resolution run
+    kernel_radius = max(1, 5 // shrinkFactor)
+    min_slice_pixels = 60 // shrinkFactor**2
+    max_erode_times = max(1, 10 // shrinkFactor)
+    ls_iterations = 1000 // shrinkFactor
+    ls_cutoff = -4 / shrinkFactor
 
-    img = sitkUtils.PullVolumeFromSlicer(inputVolumeNode.GetName())
     mask_img = sitk.Cast(sitkUtils.PullVolumeFromSlicer(inputMaskNode.GetName()), sitk.sitkUInt8)
     mask_img = sitk.BinaryThreshold(mask_img, lowerThreshold=1, insideValue=1)
     mask_img = sitk.Cast(mask_img, sitk.sitkUInt8)
@@ -673,11 +747,11 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
 
     dilate_filter_5 = sitk.BinaryDilateImageFilter()
     dilate_filter_5.SetForegroundValue(1)
-    dilate_filter_5.SetKernelRadius(5)
+    dilate_filter_5.SetKernelRadius(kernel_radius)
 
     erode_filter_5 = sitk.BinaryErodeImageFilter()
     erode_filter_5.SetForegroundValue(1)
-    erode_filter_5.SetKernelRadius(5)
+    erode_filter_5.SetKernelRadius(kernel_radius)
 
 
     # # # Binary Closing
@@ -703,7 +777,7 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
     success = False
 
     for id in range(num_control_points):
-        point = [round(ax) for ax in self.markupsTableWidget.getNthControlPointIJKCoords(id)]
+        point = [round(ax) // shrinkFactor for ax in self.markupsTableWidget.getNthControlPointIJKCoords(id)]
         points = [point]
 
         connected_filter = sitk.ConnectedThresholdImageFilter()
@@ -721,7 +795,7 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
         plane = None
         init_erosion = None
         x = 0
-        l=10
+        l=max_erode_times
 
         connected_img = connected_filter.Execute(void_volume_img)
 
@@ -849,7 +923,7 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
                 while True:
                     stat.Execute(prev_slice)
                     print(stat.GetNumberOfPixels(1))
-                    if stat.GetNumberOfPixels(1) < 60:
+                    if stat.GetNumberOfPixels(1) < min_slice_pixels:
                        break
                     temp_prev_slice = erode_filter.Execute(prev_slice)
                     if not np.any(temp_prev_slice):
@@ -937,7 +1011,7 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
                 
                 while True:
                     stat.Execute(prev_slice)
-                    if stat.GetNumberOfPixels(1) < 60:
+                    if stat.GetNumberOfPixels(1) < min_slice_pixels:
                        break
                     temp_prev_slice = erode_filter.Execute(prev_slice)
                     if not np.any(temp_prev_slice):
@@ -1022,7 +1096,7 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
         ls_filter.SetLowerThreshold(-9999)
         ls_filter.SetUpperThreshold(1.5)
         ls_filter.SetMaximumRMSError(0.02)
-        ls_filter.SetNumberOfIterations(1000)
+        ls_filter.SetNumberOfIterations(ls_iterations)
         ls_filter.SetCurvatureScaling(1)
         ls_filter.SetPropagationScaling(1)
         ls_filter.SetReverseExpansionDirection(True)
@@ -1031,7 +1105,7 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
         ls_img.SetSpacing(img.GetSpacing())
         # sitk.WriteImage(ls_img, 'Z:/work2/manske/temp/seedpointfix/levelset.nii')
 
-        output_img = ls_img>-4
+        output_img = ls_img>ls_cutoff
         output_img = (output_img * tmp_mask_img) | comb_erosion
         # sitk.WriteImage(output_img, 'Z:/work2/manske/temp/seedpointfix/out.nii')
         
@@ -1044,6 +1118,20 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
         success = True
     
     if success:
+      if shrinkFactor > 1:
+        # back to the geometry of the input volume, like a full resolution result
+        size, origin, spacing, direction = full_geometry
+        final_img = sitk.Resample(final_img, size, sitk.Transform(), sitk.sitkNearestNeighbor,
+                                  origin, spacing, direction, 0, final_img.GetPixelID())
+      # replace only the segments added by an earlier preview on this output
+      segmentation = outputVolumeNode.GetSegmentation()
+      if self._previewSegments and self._previewSegments[0] == outputVolumeNode.GetID():
+        for segmentId in self._previewSegments[1]:
+          if segmentation.GetSegment(segmentId):
+            segmentation.RemoveSegment(segmentId)
+      self._previewSegments = None
+      segmentNum = segmentation.GetNumberOfSegments()
+
       tempLabelMap = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", 
                                                       "TemporaryErosionNode")
       tempLabelMap.CreateDefaultDisplayNodes()
@@ -1066,7 +1154,13 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
       erosion_id = '_'.join(erosion_id)
     
       # update widgets
-      self.outputErosionSelector.setCurrentNodeID("") # reset the output volume selector
+      if shrinkFactor > 1:
+        # keep the output selected so the full resolution run replaces the preview
+        self._previewSegments = (outputVolumeNode.GetID(), 
+                                 [segmentation.GetNthSegmentID(i) 
+                                  for i in range(segmentNum, segmentation.GetNumberOfSegments())])
+      else:
+        self.outputErosionSelector.setCurrentNodeID("") # reset the output volume selector
       self.segmentEditor.setSegmentationNode(outputVolumeNode)
       self.segmentEditor.setMasterVolumeNode(inputVolumeNode)
       self.segmentEditor.checkEraseButtons()
@@ -1112,6 +1206,7 @@ class ErosionVolumeWidget(ScriptedLoadableModuleWidget):
   def disableErosionsWidgets(self):
     """Disable widgets in the erosions layout in step 4"""
     self.getErosionsButton.enabled = False
+    self.previewButton.enabled = False
     self.progressBar.show()
 
   def setProgress(self, value):
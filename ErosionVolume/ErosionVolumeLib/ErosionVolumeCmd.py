@@ -10,7 +10,7 @@
 # Usage:       This module is designed to be run on command Line or terminal
 #              python VoidVolume.py inputImages inputContours inputSeeds outputFolder
 #                                   [--lowerThreshold] [--upperThreshold] [--sigma]
-#                                   [--minimumRadius] [--dilateErodeDistance]
+#                                   [--minimumRadius] [--dilateErodeDistance] [--workers]
 #              Images, contours, and seeds, must be in separate folders
 #              Contour and seed filenames must contain the full name of their corresponding image
 #
@@ -23,9 +23,12 @@
 #              sigma: Standard deviation for the Gaussian smoothing filter, default=1
 #              minimumRadius: Minimum erosion radius in voxels, default=3
 #              dilateErodeDistance: Morphological kernel radius in voxels, default=5
+#              workers: Number of images processed at the same time, default=2
 #
 #-----------------------------------------------------
 import SimpleITK as sitk, os
+import csv, itertools, queue, threading
+from concurrent.futures import ThreadPoolExecutor
 import VoidVolumeLogic
 
 class VoidVolumeLogicCmd:
@@ -53,6 +56,8 @@ if __name__ == "__main__":
                         help='Minimum erosion radius in voxels, default=3', metavar='')
     parser.add_argument('-ded', '--dilateErodeDistance', type=int, default=4,
                         help='Morphological kernel radius in voxels, default=4', metavar='')
+    parser.add_argument('-nw', '--workers', type=int, default=2,
+                        help='Number of images processed at the same time, default=2', metavar='')
     args = parser.parse_args()
 
     input_dir = args.inputImages
@@ -65,48 +70,61 @@ if __name__ == "__main__":
     minimumRadius = args.minimumRadius
     dilateErodeDistance = args.dilateErodeDistance
 
-    contour_list = os.listdir(contour_dir)
-    seeds_list = os.listdir(seeds_dir)
-    for file in os.listdir(input_dir):
+    # scandir gets the file type from the directory entry, so sub-folders
+    #  are skipped without a stat call per name
+    with os.scandir(contour_dir) as entries:
+        contour_list = [entry.name for entry in entries if entry.is_file()]
+    with os.scandir(seeds_dir) as entries:
+        seeds_list = [entry.name for entry in entries if entry.is_file()]
+
+    # index contours and seed files by the image they belong to, 
+    #  e.g. SCAN_MASK.mha -> SCAN, so each image is matched with a dict lookup
+    contour_index = {}
+    for contour_name in contour_list:
+        if contour_name.endswith(args.inputMask):
+            contour_index.setdefault(contour_name[:-len(args.inputMask)], []).append(contour_name)
+    seeds_index = {}
+    for seeds_name in seeds_list:
+        if seeds_name.endswith(args.seeds):
+            seeds_index.setdefault(seeds_name[:-len(args.seeds)], []).append(seeds_name)
+
+    def processImage(file):
+        """Find the erosions in one image and write them to the output folder"""
         # read image
         try:
             img = sitk.ReadImage(input_dir + '/' + file)
         except:
             print('Could not read in ' + file)
-            continue
+            return
 
         filename = os.path.splitext(file)[0]
         
         #read mask(s)
-        contours = []
-        for contour_name in contour_list:
-            if filename in contour_name:
-                contours.append(contour_name)
+        contours = contour_index.get(filename)
+        if contours is None:
+            # other names only have to contain the image name
+            contours = [contour_name for contour_name in contour_list if filename in contour_name]
         if len(contours) == 0:
             print("No contours found for " + file)
-            continue
+            return
 
         #read seeds
         seeds = []
         HEADER = 3
-        lineCount = 0
-        for seeds_name in seeds_list:
-            if file in seeds_name:
-                with open(seeds_dir + file + '_SEEDS') as fcsv:
-                    for line in fcsv:
-                        # line = 'id,x,y,z,ow,ox,oy,oz,vis,sel,lock,label,desc,associatedNodeID'
-                        if lineCount >= HEADER:
-                            seed = line.split(',')
-                            x = int(float(seed[1]))
-                            y = int(float(seed[2]))
-                            z = int(float(seed[3]))
-                            seeds.append((x,y,z))
-                        lineCount += 1
+        seeds_names = seeds_index.get(filename)
+        if seeds_names is None:
+            seeds_names = [seeds_name for seeds_name in seeds_list if filename in seeds_name]
+        for seeds_name in seeds_names:
+            with open(os.path.join(seeds_dir, seeds_name), newline='') as fcsv:
+                # row = 'id,x,y,z,ow,ox,oy,oz,vis,sel,lock,label,desc,associatedNodeID'
+                for seed in itertools.islice(csv.reader(fcsv), HEADER, None):
+                    seeds.append((int(float(seed[1])), int(float(seed[2])), int(float(seed[3]))))
         if len(seeds) == 0:
             print("No seeds found or 0 seeds set for " + file)
 
         for contour_name in contours:
-            contour = sitk.Cast(sitk.ReadImage(contour_dir + '/' + contour_name), sitk.sitkUInt8)
+            # read straight into UInt8, no separate cast of the whole image
+            contour = sitk.ReadImage(contour_dir + '/' + contour_name, sitk.sitkUInt8)
             
 
             # create erosion logic object
@@ -122,4 +140,30 @@ if __name__ == "__main__":
 
             print("Saving output files")
             contour_filename = os.path.splitext(contour_name)[0]
-            sitk.WriteImage(erosion_img, output_dir + '/' + contour_filename + '_ER.mha')
+            write_queue.put((erosion_img, output_dir + '/' + contour_filename + '_ER.mha'))
+
+    def writeImages(write_queue):
+        """Write (image, path) pairs from the queue until None is received"""
+        while True:
+            item = write_queue.get()
+            if item is None:
+                break
+            try:
+                sitk.WriteImage(*item)
+            except:
+                print('Could not write ' + item[1])
+
+    # outputs are written on a separate thread so the next erosion is computed
+    #  while the previous one is saved, the bounded queue stops results piling up
+    write_queue = queue.Queue(maxsize=2)
+    writer = threading.Thread(target=writeImages, args=(write_queue,))
+    writer.daemon = True
+    writer.start()
+
+    # images do not depend on each other, so several are processed at the same time
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(processImage, os.listdir(input_dir)))
+    finally:
+        write_queue.put(None)
+        writer.join()
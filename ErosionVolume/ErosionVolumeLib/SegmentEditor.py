@@ -282,22 +282,14 @@ class SegmentEditor:
     # Get erase mask segment as numpy array
     eraseArray = slicer.util.arrayFromSegmentBinaryLabelmap(segmentationNode, eraseId, volumeNode)
 
-    slices = eraseArray.shape[0]
-    row = eraseArray.shape[1]
-    col = eraseArray.shape[2]
-
     # Add all segments back but after erasing
     idx = 0
     for segmentArray in segmentArrays:
       segmentationNode.GetSegmentation().AddSegment(segments[idx], segmentIds[idx])
 
       if segmentIds[idx] == self.segmentIdToErase:
-        # Iterate through voxels
-        for i in range(slices):
-          for j in range(row):
-            for k in range(col):
-              if(eraseArray[i, j, k]):
-                segmentArray[i, j, k] = 0
+        # clear every voxel covered by the erase mask at once
+        segmentArray[eraseArray != 0] = 0
 
       # Convert back to label map array
       slicer.util.updateSegmentBinaryLabelmapFromArray(segmentArray, segmentationNode, segmentIds[idx], volumeNode)
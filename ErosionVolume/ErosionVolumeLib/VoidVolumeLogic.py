@@ -31,6 +31,7 @@
 #
 #-----------------------------------------------------
 import SimpleITK as sitk
+import numpy as np
 
 class VoidVolumeLogic:
     def __init__(self, img=None, mask=None, lower=530, upper=15000, sigma=1,
@@ -85,37 +86,47 @@ class VoidVolumeLogic:
             Image: All voids inside ROI are marked with the value 1, 
                    and all other regions are marked with 0.  
         """
-        # binarize the bone
+        # binarize the bone, then select background and voids in the bone 
+        #  inside the mask in one pass over the arrays
+        contour_arr = sitk.GetArrayViewFromImage(self.contour_img)
         if self.auto_thresh:
-            index = self.method
-            if index == 0:
-                thresh = sitk.OtsuThresholdImageFilter()
-            elif index == 1:
-                thresh = sitk.HuangThresholdImageFilter()
-            elif index == 2:
-                thresh = sitk.MaximumEntropyThresholdImageFilter()
-            elif index == 3:
-                thresh = sitk.MomentsThresholdImageFilter()
-            elif index == 4:
-                thresh = sitk.YenThresholdImageFilter()
-            thresh.SetOutsideValue(1)
-            thresh.SetInsideValue(0)
-            thresh_img = thresh.Execute(gaussian_img)
+            thresh_img = self.autoThreshold(gaussian_img, self.method)
+            void_arr = (sitk.GetArrayViewFromImage(thresh_img) == 0) & (contour_arr != 0)
         else:
-            thresh_img = sitk.BinaryThreshold(gaussian_img, 
-                                          lowerThreshold=self.lower_threshold,
-                                          upperThreshold=self.upper_threshold,
-                                          insideValue=1)
+            gaussian_arr = sitk.GetArrayViewFromImage(gaussian_img)
+            void_arr = (((gaussian_arr < self.lower_threshold) | (gaussian_arr > self.upper_threshold)) 
+                        & (contour_arr != 0))
 
-        # invert to select background and voids in the bone
-        invert_filter = sitk.InvertIntensityImageFilter()
-        invert_filter.SetMaximum(1)
-        void_volume_img = invert_filter.Execute(thresh_img)
-
-        void_volume_img = self.contour_img * void_volume_img
+        void_volume_img = sitk.GetImageFromArray(void_arr.view(np.uint8))
+        void_volume_img.CopyInformation(self.contour_img)
 
         return void_volume_img
 
+    def autoThreshold(self, gaussian_img, method):
+        """
+        Binarize the bone with an automatic thresholding method.
+
+        Args:
+            gaussian_img (Image)
+            method (int): 0 Otsu, 1 Huang, 2 Maximum Entropy, 3 Moments, 4 Yen
+
+        Returns:
+            Image: Voids are marked with the value 0, and the bone with 1.
+        """
+        if method == 0:
+            thresh = sitk.OtsuThresholdImageFilter()
+        elif method == 1:
+            thresh = sitk.HuangThresholdImageFilter()
+        elif method == 2:
+            thresh = sitk.MaximumEntropyThresholdImageFilter()
+        elif method == 3:
+            thresh = sitk.MomentsThresholdImageFilter()
+        elif method == 4:
+            thresh = sitk.YenThresholdImageFilter()
+        thresh.SetOutsideValue(1)
+        thresh.SetInsideValue(0)
+        return thresh.Execute(gaussian_img)
+
     def distanceVoidVolume(self, void_volume_img, radius):
         """
         Label voids in the bone that are larger than the specified value in separation. 
@@ -128,8 +139,10 @@ class VoidVolumeLogic:
             Image
         """
 
+        # only distances up to radius are kept, so compare squared distances
+        #  against radius**2 and skip the square root over the whole image
         distance_filter = sitk.SignedMaurerDistanceMapImageFilter()
-        distance_filter.SetSquaredDistance(False)
+        distance_filter.SetSquaredDistance(True)
         distance_filter.SetBackgroundValue(1)
         inner_img = distance_filter.Execute(void_volume_img)
 
@@ -138,7 +151,7 @@ class VoidVolumeLogic:
 
         inner_img = sitk.BinaryThreshold(inner_img,
                                         lowerThreshold=1,
-                                        upperThreshold=radius,
+                                        upperThreshold=radius**2,
                                         insideValue=1)
         # image_viewer.SetTitle('innerimg using ImageViewer class')
         # image_viewer.Execute(inner_img)
@@ -156,7 +169,7 @@ class VoidVolumeLogic:
 
         outer_img = sitk.BinaryThreshold(outer_img,
                                          lowerThreshold=1,
-                                         upperThreshold=radius,
+                                         upperThreshold=radius**2,
                                          insideValue=1)
 
         # image_viewer.SetTitle('out using ImageViewer class')
@@ -199,24 +212,21 @@ class VoidVolumeLogic:
         Returns:
             Image
         """
-        seeds_img = sitk.Image(self.contour_img.GetSize(), sitk.sitkUInt8)
+        # mark all seed points with one store, the array is indexed (z,y,x)
+        seeds_arr = np.zeros(sitk.GetArrayViewFromImage(self.contour_img).shape, dtype=np.uint8)
+        seeds_crop = np.array(self._seeds_crop, dtype=np.intp).reshape(-1, 3)
+        seeds_arr[seeds_crop[:,2], seeds_crop[:,1], seeds_crop[:,0]] = 1
+        seeds_img = sitk.GetImageFromArray(seeds_arr)
         seeds_img.CopyInformation(self.contour_img)
-        for seed in self._seeds_crop:
-            seeds_img[seed] = 1
-
-        # apply distance transformation to the seed points
-        print("Applying distance map filter")
-        distance_filter = sitk.SignedMaurerDistanceMapImageFilter()
-        distance_filter.SetSquaredDistance(False)
-        distance_filter.SetBackgroundValue(0)
-        distance_img = distance_filter.Execute(seeds_img)
 
-        # inflate seed points
-        upper = self.dilateErodeDistance if self.dilateErodeDistance != 0 else 1
-        seeds_img = sitk.BinaryThreshold(distance_img, 
-                                         lowerThreshold=0, 
-                                         upperThreshold=self.dilateErodeDistance, 
-                                         insideValue=1)
+        # inflate seed points by dilateErodeDistance voxels, dilating only around 
+        #  the seeds instead of thresholding a distance map of the whole image
+        print("Applying dilate filter")
+        dilate_filter = sitk.BinaryDilateImageFilter()
+        dilate_filter.SetForegroundValue(1)
+        dilate_filter.SetKernelType(sitk.sitkBall)
+        dilate_filter.SetKernelRadius([self.dilateErodeDistance]*3)
+        seeds_img = dilate_filter.Execute(seeds_img)
 
         # combine inflated seed points and voids in the bone
         void_seeds_img = seeds_img | erode_img
@@ -269,6 +279,10 @@ class VoidVolumeLogic:
         Returns:
             Image
         """
+        # nothing to grow, the output would be the input voids
+        if iterations == 0 or not np.any(sitk.GetArrayViewFromImage(ero1_img)):
+            return ero1_img
+
         # distance map for level set filter
         print("Applying distance map filter")
         distance_filter = sitk.SignedMaurerDistanceMapImageFilter()
@@ -277,9 +291,15 @@ class VoidVolumeLogic:
         distance_filter.SetBackgroundValue(0)
         distance_img = distance_filter.Execute(ero1_img)
         
-        # level set requires spacing of [1,1,1] and float voxel type
+        # level set requires spacing of [1,1,1] and float voxel type, 
+        #  the smoothed model is usually float already so it is used as is
+        #  and its spacing is restored afterwards
         distance_img.SetSpacing([1,1,1])
-        feature_img = sitk.Cast(self.model_img, sitk.sitkFloat32)
+        model_spacing = self.model_img.GetSpacing()
+        if self.model_img.GetPixelID() == sitk.sitkFloat32:
+            feature_img = self.model_img
+        else:
+            feature_img = sitk.Cast(self.model_img, sitk.sitkFloat32)
         feature_img.SetSpacing([1,1,1])
 
         # level set region growing
@@ -292,14 +312,19 @@ class VoidVolumeLogic:
         ls_filter.SetCurvatureScaling(1)
         ls_filter.SetPropagationScaling(1)
         ls_filter.SetReverseExpansionDirection(True)
-        ls_img = ls_filter.Execute(distance_img, feature_img)
-
-        # restore spacing
+        try:
+            ls_img = ls_filter.Execute(distance_img, feature_img)
+        finally:
+            # restore spacing, also if the level set fails
+            self.model_img.SetSpacing(model_spacing)
         ls_img.SetSpacing(ero1_img.GetSpacing())
 
-        # mask the level set output with periosteal mask
-        output_img = sitk.BinaryThreshold(ls_img, lowerThreshold=1, insideValue=1)
-        output_img = (output_img * self.contour_img) | ero1_img
+        # mask the level set output with periosteal mask, in one pass over the arrays
+        output_arr = ((sitk.GetArrayViewFromImage(ls_img) >= 1) 
+                      & (sitk.GetArrayViewFromImage(self.contour_img) != 0)
+                      | (sitk.GetArrayViewFromImage(ero1_img) != 0))
+        output_img = sitk.GetImageFromArray(output_arr.view(np.uint8))
+        output_img.CopyInformation(ero1_img)
 
         return output_img
 
@@ -318,18 +343,20 @@ class VoidVolumeLogic:
         connected_filter.SetFullyConnected(True)
         relabeled_img = connected_filter.Execute(void_volume_img)
 
-        relabel_map = {}
+        # lookup table from component label to erosion id, 
+        #  labels without a seed point keep their value
+        label_arr = sitk.GetArrayViewFromImage(relabeled_img)
+        relabel_lut = np.arange(connected_filter.GetObjectCount()+1, dtype=label_arr.dtype)
         for seed, erosionId in zip(self._seeds_crop, self.erosionIds):
             key = relabeled_img[seed]
             if key > 0:
-                relabel_map[key] = erosionId
-        
-        relabel_filter = sitk.ChangeLabelImageFilter()
-        # print(relabel_map)
-        relabel_filter.SetChangeMap(relabel_map)
-        relabeled_img = relabel_filter.Execute(relabeled_img)
+                relabel_lut[key] = erosionId
 
-        return relabeled_img
+        # relabel every voxel in one pass
+        output_img = sitk.GetImageFromArray(relabel_lut[label_arr])
+        output_img.CopyInformation(relabeled_img)
+
+        return output_img
 
     def execute(self, step):
         """
@@ -378,10 +405,18 @@ class VoidVolumeLogic:
         thresh_img = sitk.BinaryThreshold(contour_img, lowerThreshold=1, insideValue=1)
 
         # bounding box cut
-        lss_filter = sitk.LabelStatisticsImageFilter()
-        lss_filter.Execute(thresh_img, thresh_img)
-        bounds = lss_filter.GetBoundingBox(1)
-        xmin_crop, xmax, ymin_crop, ymax, zmin_crop, zmax = bounds
+        #  from projections of the binary mask instead of a label statistics pass,
+        #  the array is indexed (z,y,x) and the max bounds are inclusive
+        thresh_arr = sitk.GetArrayViewFromImage(thresh_img)
+        zy_any = thresh_arr.any(axis=2)
+        z_index = np.flatnonzero(zy_any.any(axis=1))
+        y_index = np.flatnonzero(zy_any.any(axis=0))
+        x_index = np.flatnonzero(thresh_arr.any(axis=(0,1)))
+        if len(x_index) == 0:
+            raise ValueError('The mask is empty.')
+        xmin_crop, xmax = int(x_index[0]), int(x_index[-1])
+        ymin_crop, ymax = int(y_index[0]), int(y_index[-1])
+        zmin_crop, zmax = int(z_index[0]), int(z_index[-1])
         xmin_crop = round(xmin_crop) 
         ymin_crop = round(ymin_crop) 
         zmin_crop = round(zmin_crop) 
@@ -408,8 +443,6 @@ class VoidVolumeLogic:
         direction = self.model_img.GetDirection()
 
         # crop bone model
-        model_img = sitk.Image(width, height, depth, self.model_img.GetPixelID())
-        model_img.CopyInformation(self.contour_img)
         destination_x = round((model_origin[0] - contour_origin[0]) / spacing)
         destination_y = round((model_origin[1] - contour_origin[1]) / spacing)
         destination_z = round((model_origin[2] - contour_origin[2]) / spacing)
@@ -419,24 +452,34 @@ class VoidVolumeLogic:
         r.SetMatrix(direction)
         destination_index = r.TransformPoint((destination_x, destination_y, destination_z))
         destination_index = (round(destination_index[0]), round(destination_index[1]), round(destination_index[2]))
-        paste_filter = sitk.PasteImageFilter()
-        paste_filter.SetDestinationIndex(destination_index)
-        paste_filter.SetSourceSize(model_size)
-        self.model_img = paste_filter.Execute(model_img, self.model_img)
+        source_index = [-index for index in destination_index]
+        if all(0 <= index and index + size <= model_length for index, size, model_length 
+               in zip(source_index, (width, height, depth), model_size)):
+            # the model covers the whole mask, so take that region directly
+            model_img = sitk.RegionOfInterest(self.model_img, [width, height, depth], source_index)
+            model_img.CopyInformation(self.contour_img)
+            self.model_img = model_img
+        else:
+            # paste the model into an empty image, the rest of the mask is left at 0
+            model_img = sitk.Image(width, height, depth, self.model_img.GetPixelID())
+            model_img.CopyInformation(self.contour_img)
+            paste_filter = sitk.PasteImageFilter()
+            paste_filter.SetDestinationIndex(destination_index)
+            paste_filter.SetSourceSize(model_size)
+            self.model_img = paste_filter.Execute(model_img, self.model_img)
         # print(model_img.GetOrigin())
         
         # update seed points
         destination_x *= int(direction[0])
         destination_y *= int(direction[4])
         destination_z *= int(direction[8])
-        self._seeds_crop = [(seed[0]+destination_x, seed[1]+destination_y, seed[2]+destination_z)
-                            for seed in self.seeds]
-        for i, seed in reversed(list(enumerate(self._seeds_crop))):
-            is_in_range = ((0 <= seed[0] < width) and 
-                           (0 <= seed[1] < height) and 
-                           (0 <= seed[2] < depth))
-            if not is_in_range:
-                self._removeNthSeed(i)
+        # shift all seed points at once and keep the ones inside the cropped model
+        seeds_crop = np.array(self.seeds, dtype=int).reshape(-1, 3)
+        seeds_crop += [destination_x, destination_y, destination_z]
+        is_in_range = np.all((seeds_crop >= 0) & (seeds_crop < [width, height, depth]), axis=1)
+        self._seeds_crop = [tuple(seed) for seed in seeds_crop[is_in_range].tolist()]
+        self.seeds[:] = [seed for seed, keep in zip(self.seeds, is_in_range) if keep]
+        self.erosionIds[:] = [erosionId for erosionId, keep in zip(self.erosionIds, is_in_range) if keep]
 
     def setThresholds(self, lower_threshold, upper_threshold):
         """
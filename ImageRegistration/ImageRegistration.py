@@ -709,11 +709,6 @@ class ImageRegistrationWidget(ScriptedLoadableModuleWidget):
     slicer.util.resetSliceViews()
     
     if input1 and input2 and not output:
-      #remove existing loggers
-      if self.logger.hasHandlers():
-        for handler in self.logger.handlers:
-          self.logger.removeHandler(handler)
-          
        #initialize logger with filename
       try:
         filename = input1.GetStorageNode().GetFullNameFromFileName()
@@ -722,10 +717,15 @@ class ImageRegistrationWidget(ScriptedLoadableModuleWidget):
         print(filename)
       except:
         filename = 'share/' + input1.GetName() + '.'
-      logHandler = logging.FileHandler(filename)
-      
-      self.logger.addHandler(logHandler)
-      self.logger.info("Using Erosion Volume Module with " + input1.GetName() + " and " + input2.GetName() + "\n")
+
+      #keep the handler if it already writes to this file, otherwise close and replace the old ones
+      logFilenames = {getattr(handler, 'baseFilename', None) for handler in self.logger.handlers}
+      if os.path.abspath(filename) not in logFilenames:
+        for handler in list(self.logger.handlers):
+          self.logger.removeHandler(handler)
+          handler.close()
+        self.logger.addHandler(logging.FileHandler(filename, delay=True))
+        self.logger.info("Using Erosion Volume Module with " + input1.GetName() + " and " + input2.GetName() + "\n")
 
   def onSelectSeed(self):
     """Run this whenever the seed point selector in step 5 changes"""
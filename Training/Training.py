@@ -13,9 +13,18 @@ import logging
 from TrainingLib.ErosionVolumeLogic import ErosionVolumeLogic
 from TrainingLib.MarkupsTable import MarkupsTable
 import os
+import pathlib
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
 
 import SimpleITK as sitk
 import sitkUtils
+import numpy as np
+
+# logos shown in the help text, stored in the Logos folder next to the module folders
+LOGO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'Logos')
+LOGOS = {'bam': os.path.join(LOGO_DIR, 'BAM_Logo.png'),
+         'manske': os.path.join(LOGO_DIR, 'Manske_Lab_Logo.png')}
 
 #
 # ErosionVolume
@@ -46,20 +55,8 @@ Manske Lab<br>
 """ # replace with organization, grant and thanks.
 
   def getLogo(self, logo_type):
-    #get directory
-    directory = os.path.split(os.path.split(os.path.realpath(__file__))[0])[0]
-
-    #set file name
-    if logo_type == 'bam':
-      name = 'BAM_Logo.png'
-    elif logo_type == 'manske':
-      name = 'Manske_Lab_Logo.png'
-
-    #
-    if '\\' in directory:
-      return directory + '\\Logos\\' + name
-    else:
-      return directory + '/Logos/' + name
+    # paths are worked out once when the module is imported
+    return LOGOS[logo_type]
 
 #
 # ErosionVolumeWidget
@@ -79,8 +76,36 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
     self.reference_erosions_dir = os.path.join(self.images_dir, 'ErosionSegmentations')
     self.images_dir = os.path.join(self.images_dir, 'TestFiles')
 
+    self._markupsDisplayNode = None # display node of the current seed points
+    self._lastShownVolumeID = None  # ID of the volume in the slice viewers
+    self._tempLabelMap = None       # label map reused to import erosions into segmentations
+    self._running = False           # erosions are being computed, the inputs must not change
+    self._referenceCache = {}       # reference erosions read so far, keyed by path
+
+    # list the training set once, references and seeds are keyed by scan id
+    self._image_files = [(image[:-len('.nii.gz')], os.path.join(self.images_dir, image))
+                         for image in self._listDir(self.images_dir)
+                         if image.endswith('.nii.gz')]
+    self._reference_index = {}
+    for reference in self._listDir(self.reference_erosions_dir):
+      self._reference_index[self._scanId(reference)] = os.path.join(self.reference_erosions_dir, reference)
+    self._seed_index = {}
+    for markup in self._listDir(self.seed_points_dir):
+      self._seed_index.setdefault(self._scanId(markup), []).append(os.path.join(self.seed_points_dir, markup))
+
     ScriptedLoadableModuleWidget.__init__(self, parent)
 
+  def _scanId(self, name):
+    """Return the id of the training scan a file or node name belongs to, e.g. '3' for '3_Training_Seeds'"""
+    return name.split('_')[0]
+
+  def _listDir(self, directory):
+    """Return the sorted names of the files in the directory, or an empty list if it does not exist"""
+    if not os.path.isdir(directory):
+      return []
+    with os.scandir(directory) as entries:
+      return sorted(entry.name for entry in entries if entry.is_file())
+
   def setup(self):
     # Buttons for testing
     ScriptedLoadableModuleWidget.setup(self)
@@ -99,6 +124,18 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
 
     # slicer.mrmlScene.Clear(True)
 
+  def cleanup(self):
+    """Stop the timer, drop the seed point observers and remove the temporary label map when the module is reloaded or closed"""
+    # these only exist once the proceed button has been pressed
+    if hasattr(self, '_viewerUpdateTimer'):
+      self._viewerUpdateTimer.stop()
+    if hasattr(self, 'markupsTableWidget'):
+      self.markupsTableWidget.setCurrentNode(None)
+    # the temporary label map is a full-size volume, do not leave it in the scene
+    if self._tempLabelMap is not None and slicer.mrmlScene.IsNodePresent(self._tempLabelMap):
+      slicer.mrmlScene.RemoveNode(self._tempLabelMap)
+    self._tempLabelMap = None
+
   def proceed(self):
     self.proceedButton.deleteLater()
     self.warning.deleteLater()
@@ -107,12 +144,12 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
 
     slicer.mrmlScene.Clear(False)
 
-    for image in os.listdir(self.images_dir):
-      if not ('nii.gz' in image):
-        continue
-      image_name = os.path.splitext(image)[0]
-      image = os.path.join(self.images_dir, image)
-      image = sitk.ReadImage(image)
+    # read the scans in parallel, but push them to the scene on the main thread
+    #  since the MRML scene is not thread-safe
+    with ThreadPoolExecutor(max_workers=4) as executor:
+      images = list(executor.map(sitk.ReadImage, [path for _, path in self._image_files]))
+
+    for (image_name, _), image in zip(self._image_files, images):
       volume_node = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLScalarVolumeNode', image_name)
       sitkUtils.PushVolumeToSlicer(image, volume_node)
     
@@ -143,49 +180,21 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
     erosionsLayout.setVerticalSpacing(5)
 
     # input volume selector
-    self.inputVolumeSelector = slicer.qMRMLNodeComboBox()
-    self.inputVolumeSelector.nodeTypes = ["vtkMRMLScalarVolumeNode"]
-    self.inputVolumeSelector.selectNodeUponCreation = False
-    self.inputVolumeSelector.addEnabled = False
-    self.inputVolumeSelector.renameEnabled = True
-    self.inputVolumeSelector.removeEnabled = True
-    self.inputVolumeSelector.noneEnabled = False
-    self.inputVolumeSelector.showHidden = False
-    self.inputVolumeSelector.showChildNodeTypes = False
-    self.inputVolumeSelector.setMRMLScene(slicer.mrmlScene)
-    self.inputVolumeSelector.setToolTip( "Pick the greyscale scan" )
-    self.inputVolumeSelector.setCurrentNode(None)
+    self.inputVolumeSelector = self._makeNodeSelector(["vtkMRMLScalarVolumeNode"],
+                                                      "Pick the greyscale scan")
     erosionsLayout.addRow("Input Volume: ", self.inputVolumeSelector)
 
     # input mask selector
-    self.inputMaskSelector = slicer.qMRMLNodeComboBox()
-    self.inputMaskSelector.nodeTypes = ["vtkMRMLScalarVolumeNode","vtkMRMLLabelMapVolumeNode"]
-    self.inputMaskSelector.selectNodeUponCreation = False
-    self.inputMaskSelector.addEnabled = False
-    self.inputMaskSelector.renameEnabled = True
-    self.inputMaskSelector.removeEnabled = True
-    self.inputMaskSelector.noneEnabled = False
-    self.inputMaskSelector.showHidden = False
-    self.inputMaskSelector.showChildNodeTypes = False
-    self.inputMaskSelector.setMRMLScene(slicer.mrmlScene)
-    self.inputMaskSelector.setToolTip( "Pick the mask label map" )
-    self.inputMaskSelector.setCurrentNode(None)
+    self.inputMaskSelector = self._makeNodeSelector(["vtkMRMLScalarVolumeNode","vtkMRMLLabelMapVolumeNode"],
+                                                    "Pick the mask label map")
     erosionsLayout.addRow("Input Mask: ", self.inputMaskSelector)
 
     # output volume selector
-    self.outputErosionSelector = slicer.qMRMLNodeComboBox()
-    self.outputErosionSelector.nodeTypes = ["vtkMRMLSegmentationNode"]
-    self.outputErosionSelector.selectNodeUponCreation = True
-    self.outputErosionSelector.addEnabled = True
-    self.outputErosionSelector.removeEnabled = True
-    self.outputErosionSelector.renameEnabled = True
-    self.outputErosionSelector.noneEnabled = False
-    self.outputErosionSelector.showHidden = False
-    self.outputErosionSelector.showChildNodeTypes = False
-    self.outputErosionSelector.setMRMLScene(slicer.mrmlScene)
-    self.outputErosionSelector.baseName = "ER"
-    self.outputErosionSelector.setToolTip( "Pick the output segmentation to store the erosions in" )
-    self.outputErosionSelector.setCurrentNode(None)
+    self.outputErosionSelector = self._makeNodeSelector(["vtkMRMLSegmentationNode"],
+                                                        "Pick the output segmentation to store the erosions in",
+                                                        addEnabled=True,
+                                                        selectNodeUponCreation=True,
+                                                        baseName="ER")
     erosionsLayout.addRow("Output Erosions: ", self.outputErosionSelector)
 
     # seed point table
@@ -198,7 +207,7 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
     self.markupsTableWidget.setJumpToSliceEnabled(True)
 
     # horizontal white space
-    erosionsLayout.addRow(qt.QLabel(""))
+    erosionsLayout.addItem(qt.QSpacerItem(0, 10, qt.QSizePolicy.Minimum, qt.QSizePolicy.Fixed))
 
     # glyph size 
     self.glyphSizeBox = qt.QDoubleSpinBox()
@@ -240,13 +249,19 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
     erosionButtonFrame.setLayout(executeGridLayout)
     erosionsLayout.addRow(erosionButtonFrame)
     
+    # timer to redraw the viewer windows only after the input volume selection settles
+    self._viewerUpdateTimer = qt.QTimer()
+    self._viewerUpdateTimer.setSingleShot(True)
+    self._viewerUpdateTimer.setInterval(150)
+    self._viewerUpdateTimer.timeout.connect(self.updateSliceViewers)
+
     # connections
     self.inputVolumeSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.checkErosionsButton)
     self.inputVolumeSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.onSelectInputVolume)
     self.inputMaskSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.onSelectInputMask)
     self.inputMaskSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.checkErosionsButton)
     self.outputErosionSelector.connect("currentNodeChanged(vtkMRMLNode*)", self.checkErosionsButton)
-    self.outputErosionSelector.connect("nodeAddedByUser(vtkMRMLNode*)", lambda node: self.onAddOutputErosion(node))
+    self.outputErosionSelector.connect("nodeAddedByUser(vtkMRMLNode*)", self.onAddOutputErosion)
     self.markupsTableWidget.getMarkupsSelector().connect("currentNodeChanged(vtkMRMLNode*)", self.checkErosionsButton)
     self.markupsTableWidget.getMarkupsSelector().connect("currentNodeChanged(vtkMRMLNode*)", self.onSelectSeed)
     self.glyphSizeBox.valueChanged.connect(self.onGlyphSizeChanged)
@@ -256,20 +271,51 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
     # logger
     self.logger = logging.getLogger("erosion_volume")
 
+  def _makeNodeSelector(self, nodeTypes, toolTip, addEnabled=False, 
+                        selectNodeUponCreation=False, baseName=None):
+    """
+    Create a node selector on the current scene with the settings shared by 
+    all selectors in this module.
+
+    Args:
+      nodeTypes (list of str): MRML node classes the selector lists
+      toolTip (str)
+      addEnabled (bool): allow creating new nodes from the selector
+      selectNodeUponCreation (bool): select nodes created from the selector
+      baseName (str): name given to nodes created from the selector
+
+    Returns:
+      qMRMLNodeComboBox
+    """
+    selector = slicer.qMRMLNodeComboBox()
+    selector.nodeTypes = nodeTypes
+    selector.selectNodeUponCreation = selectNodeUponCreation
+    selector.addEnabled = addEnabled
+    selector.renameEnabled = True
+    selector.removeEnabled = True
+    selector.noneEnabled = False
+    selector.showHidden = False
+    selector.showChildNodeTypes = False
+    selector.setMRMLScene(slicer.mrmlScene)
+    if baseName:
+      selector.baseName = baseName
+    selector.setToolTip(toolTip)
+    selector.setCurrentNode(None)
+    return selector
+
   def checkErosionsButton(self):
-    self.getErosionsButton.enabled = (self.inputVolumeSelector.currentNode() and 
-                                     self.inputMaskSelector.currentNode() and
-                                     self.outputErosionSelector.currentNode() and
-                                     self.markupsTableWidget.getCurrentNode())
-    self.revealSeedPointsButton.enabled = (self.inputVolumeSelector.currentNode() and 
-                                          self.inputMaskSelector.currentNode())
-
-  def onSelect4(self):
-    """Update the state of the get erosions button whenever the selectors in step 4 change"""
-    self.getErosionsButton.enabled = (self.inputVolumeSelector.currentNode() and 
-                                     self.inputMaskSelector.currentNode() and
-                                     self.outputErosionSelector.currentNode() and
-                                     self.markupsTableWidget.getCurrentNode())
+    """Update the state of the buttons whenever the selectors change"""
+    if self._running:
+      # the event loop keeps running during a run, do not allow a second one
+      self.getErosionsButton.enabled = False
+      self.revealSeedPointsButton.enabled = False
+      return
+    inputsSelected = bool(self.inputVolumeSelector.currentNode() and
+                          self.inputMaskSelector.currentNode())
+    self.getErosionsButton.enabled = (inputsSelected and
+                                     self.outputErosionSelector.currentNode() is not None and
+                                     self.markupsTableWidget.getCurrentNode() is not None)
+    self.revealSeedPointsButton.enabled = inputsSelected
 
   def onSelectInputVolume(self):
     """Run this whenever the input volume selector in step 4 changes"""
@@ -281,32 +327,53 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
       self._logic.setDefaultDirectory(inputVolumeNode)
 
       # Update the spacing scale in the seed point table
-      ras2ijk = vtk.vtkMatrix4x4()
       ijk2ras = vtk.vtkMatrix4x4()
-      inputVolumeNode.GetRASToIJKMatrix(ras2ijk)
       inputVolumeNode.GetIJKToRASMatrix(ijk2ras)
+      ras2ijk = vtk.vtkMatrix4x4()
+      vtk.vtkMatrix4x4.Invert(ijk2ras, ras2ijk) # RAS to IJK is the inverse
       self.markupsTableWidget.setCoordsMatrices(ras2ijk, ijk2ras)
-      # update the viewer windows
+      # update the viewer windows once the selection settles
+      self._viewerUpdateTimer.start()
+
+      # switch the log file once the selector change has been handled
+      qt.QTimer.singleShot(0, self.updateLogFile)
+
+  def updateSliceViewers(self):
+    """Show the selected input volume in the viewer windows, unless it is already shown"""
+    inputVolumeNode = self.inputVolumeSelector.currentNode()
+    if inputVolumeNode and inputVolumeNode.GetID() != self._lastShownVolumeID:
       slicer.util.setSliceViewerLayers(background=inputVolumeNode)
       slicer.util.resetSliceViews() # centre the volume in the viewer windows
+      self._lastShownVolumeID = inputVolumeNode.GetID()
 
-      #remove existing loggers
-      if self.logger.hasHandlers():
-        for handler in self.logger.handlers:
-          self.logger.removeHandler(handler)
-          
-       #initialize logger with filename
-      try:
-        filename = inputVolumeNode.GetStorageNode().GetFullNameFromFileName()
-        filename = os.path.split(filename)[0] + '/LOG_' + os.path.split(filename)[1]
-        filename = os.path.splitext(filename)[0] + '.log'
-      except:
-        filename = 'share/' + inputVolumeNode.GetName() + '.'
-      logHandler = logging.FileHandler(filename)
-      
+  def updateLogFile(self):
+    """Log to the file of the volume selected when the timer fires, it may have been removed since"""
+    inputVolumeNode = self.inputVolumeSelector.currentNode()
+    if inputVolumeNode:
+      self.setLogFile(inputVolumeNode)
+
+  def setLogFile(self, inputVolumeNode):
+    """Log to a file next to the input volume"""
+    #initialize logger with filename
+    try:
+      volumePath = pathlib.Path(inputVolumeNode.GetStorageNode().GetFullNameFromFileName())
+      filename = str(volumePath.with_name('LOG_' + volumePath.stem + '.log'))
+    except:
+      filename = 'share/' + inputVolumeNode.GetName() + '.'
+
+    # the logger is shared with other modules, so check the handlers it actually has
+    logFilenames = {getattr(handler, 'baseFilename', None) for handler in self.logger.handlers}
+    if os.path.abspath(filename) not in logFilenames:
+      #remove and close existing loggers, iterating over a copy of the list
+      for handler in list(self.logger.handlers):
+        self.logger.removeHandler(handler)
+        handler.close()
+
+      # the file is only opened when the first record is written
+      logHandler = logging.FileHandler(filename, delay=True)
       self.logger.addHandler(logHandler)
+
       self.logger.info("Using Erosion Volume Module with " + inputVolumeNode.GetName() + "\n")
-      
 
   def onSelectInputMask(self):
     """Run this whenever the input mask selector in step 4 changes"""
@@ -333,35 +400,50 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
     self.markupsTableWidget.onMarkupsNodeChanged()
     markupsDisplayNode = self.markupsTableWidget.getCurrentNode().GetMarkupsDisplayNode()
     markupsDisplayNode.SetGlyphScale(self.glyphSizeBox.value)
+    self._markupsDisplayNode = markupsDisplayNode
 
-    markupsNode = self.markupsTableWidget.getCurrentNode()
-    num_control_points = markupsNode.GetNumberOfControlPoints()
-
-    for i in range(num_control_points):
-      id = int(markupsNode.GetNthControlPointID(i))
-      seed_pos = [round(ax) for ax in self.markupsTableWidget.getNthControlPointIJKCoords(i)]
-
-      print(seed_pos)
+    # all seed positions are converted to IJK and rounded in one go
+    for seed_pos in self.markupsTableWidget.getControlPointsIJKCoords():
+      print(seed_pos.tolist())
   
   def onGlyphSizeChanged(self):
-    markupsDisplayNode = self.markupsTableWidget.getCurrentNode().GetMarkupsDisplayNode()
-    markupsDisplayNode.SetGlyphScale(self.glyphSizeBox.value)
+    # display node is cached by onSelectSeed whenever the markups node changes
+    if self._markupsDisplayNode:
+      self._markupsDisplayNode.SetGlyphScale(self.glyphSizeBox.value)
 
   def onGetErosionsButton(self):
     """Run this whenever the get erosions button in step 4 is clicked"""
     # update widgets
+    self._running = True
     self.disableErosionsWidgets()
     # self.markupsTableWidget.updateLabels()
-
+    try:
+      self.getErosions()
+    finally:
+      # the inputs are disabled for the whole run, re-enable them even if it fails
+      self._running = False
+      self.enableErosionsWidgets()
+
+  def getErosions(self):
+    """Compute the erosions at the seed points and score them against the reference"""
     inputVolumeNode = self.inputVolumeSelector.currentNode()
     inputMaskNode = self.inputMaskSelector.currentNode()
     outputVolumeNode = self.outputErosionSelector.currentNode()
     markupsNode = self.markupsTableWidget.getCurrentNode()
 
-    self.logger.info("Erosion Volume initialized with parameters:")
-    self.logger.info("Input Volume: " + inputVolumeNode.GetName())
-    self.logger.info("Input Mask: " + inputMaskNode.GetName())
-    self.logger.info("Output Volume: " + outputVolumeNode.GetName())
+    # one record for all parameters instead of one per line
+    self.logger.info("\n".join(["Erosion Volume initialized with parameters:",
+                                "Input Volume: " + inputVolumeNode.GetName(),
+                                "Input Mask: " + inputMaskNode.GetName(),
+                                "Output Volume: " + outputVolumeNode.GetName()]))
+
+    # erosions can only be scored against a reference, check for one before computing them
+    erosion_id = self._scanId(outputVolumeNode.GetName())
+    reference_path = self._reference_index.get(erosion_id)
+    if reference_path is None:
+      slicer.util.warningDisplay('No reference erosions exist for scan "{}".'.format(erosion_id),
+                                 'Missing Reference Erosions')
+      return
     
     ready = self._logic.setErosionParameters(inputVolumeNode, 
                                           inputMaskNode, 
@@ -372,16 +454,17 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
                                           1)
     if ready:
       img = sitkUtils.PullVolumeFromSlicer(inputVolumeNode.GetName())
-      mask_img = sitk.Cast(sitkUtils.PullVolumeFromSlicer(inputMaskNode.GetName()), sitk.sitkUInt8)
-      mask_img = sitk.BinaryThreshold(mask_img, lowerThreshold=1, insideValue=1)
-      mask_img = sitk.Cast(mask_img, sitk.sitkUInt8)
-
-      resampler = sitk.ResampleImageFilter()
-      resampler.SetReferenceImage(img)
-      resampler.SetInterpolator(sitk.sitkLinear)
-      resampler.SetDefaultPixelValue(0)
-      resampler.SetTransform(sitk.Transform())
-      mask_img = resampler.Execute(mask_img)
+      # binary UInt8 mask in one pass
+      mask_img = sitk.Greater(sitkUtils.PullVolumeFromSlicer(inputMaskNode.GetName()), 0)
+
+      # masks made for the scan already share its grid, only resample the others
+      if not self._sameGeometry(mask_img, img):
+        resampler = sitk.ResampleImageFilter()
+        resampler.SetReferenceImage(img)
+        resampler.SetInterpolator(sitk.sitkLinear)
+        resampler.SetDefaultPixelValue(0)
+        resampler.SetTransform(sitk.Transform())
+        mask_img = resampler.Execute(mask_img)
 
       sigma_over_spacing = img.GetSpacing()[0]
       print(sigma_over_spacing)
@@ -400,55 +483,119 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
       edge = edge_detection_filter.Execute(gaussian_img)
       edge = sitk.Cast(edge, sitk.sitkUInt8)
 
-      dilate_filter = sitk.BinaryDilateImageFilter()
-      dilate_filter.SetForegroundValue(1)
-      dilate_filter.SetKernelRadius(1)
-
-      erode_filter = sitk.BinaryErodeImageFilter()
-      erode_filter.SetForegroundValue(1)
-      erode_filter.SetKernelRadius(1)
-
       # Binary Closing
-      dilated_img = dilate_filter.Execute(edge)
-      erode_img = erode_filter.Execute(dilated_img)
-
-      edge = erode_img
+      edge = sitk.BinaryMorphologicalClosing(edge, [1,1,1], sitk.sitkBall, 1)
 
-      invert_filter = sitk.InvertIntensityImageFilter()
-      invert_filter.SetMaximum(1)
-      full_void_volume_img = invert_filter.Execute(erode_img)
-
-      final_img = mask_img * 0
+      full_void_volume_img = sitk.BinaryNot(edge)
 
+      # seed point ids and IJK positions, shared by the segmentation and the feedback below
       num_control_points = markupsNode.GetNumberOfControlPoints()
+      seed_ids = [int(markupsNode.GetNthControlPointID(i)) for i in range(num_control_points)]
+      seeds = self.markupsTableWidget.getControlPointsIJKCoords()
       success = False
 
-      for id in range(num_control_points):
-        point = [[round(ax) for ax in self.markupsTableWidget.getNthControlPointIJKCoords(id)]]
+      # filters keep their results between Execute calls, so every worker thread builds its own set once
+      local = threading.local()
+      # split the cores between the workers on the seed filters only, the global ITK defaults stay untouched
+      num_workers = max(1, min(num_control_points, os.cpu_count() or 1))
+      filter_threads = max(1, (os.cpu_count() or 1) // num_workers)
+
+      def seedFilters():
+        if not hasattr(local, 'filters'):
+          dilate_filter = sitk.BinaryDilateImageFilter()
+          dilate_filter.SetForegroundValue(1)
+          dilate_filter.SetKernelRadius(1)
+
+          erode_filter = sitk.BinaryErodeImageFilter()
+          erode_filter.SetForegroundValue(1)
+          erode_filter.SetKernelRadius(1)
+
+          connected_filter = sitk.ConnectedThresholdImageFilter()
+          connected_filter.SetLower(1)
+          connected_filter.SetUpper(1)
+          connected_filter.SetReplaceValue(1)
+
+          stat = sitk.LabelShapeStatisticsImageFilter()
+          stat.ComputeFeretDiameterOff()
+          stat.ComputePerimeterOff()
+          stat.ComputeOrientedBoundingBoxOff()
+
+          filter = sitk.SimilarityIndexImageFilter()
+
+          distance_filter = sitk.SignedMaurerDistanceMapImageFilter()
+          distance_filter.SetInsideIsPositive(True)
+          distance_filter.SetUseImageSpacing(False)
+          distance_filter.SetBackgroundValue(0)
+
+          ls_filter = sitk.ThresholdSegmentationLevelSetImageFilter()
+          ls_filter.SetLowerThreshold(0)
+          ls_filter.SetUpperThreshold(1)
+          ls_filter.SetMaximumRMSError(0.02)
+          ls_filter.SetNumberOfIterations(500)
+          ls_filter.SetCurvatureScaling(1)
+          ls_filter.SetPropagationScaling(1)
+          ls_filter.SetReverseExpansionDirection(True)
+
+          local.filters = (dilate_filter, erode_filter, connected_filter, stat, filter, 
+                           distance_filter, ls_filter)
+          for seed_filter in local.filters:
+            seed_filter.SetNumberOfThreads(filter_threads)
+        return local.filters
+
+      # the level set feature image does not depend on the seed
+      feature_img = sitk.Cast(edge, sitk.sitkFloat32)
+      feature_img.SetSpacing([1,1,1])
+
+      # label the mask and the masked void volume once, each seed then picks its component by label
+      mask_cc = sitk.ConnectedComponent(mask_img)
+      void_cc = sitk.ConnectedComponent(full_void_volume_img * mask_img)
+      # seeds outside the scan read 0, so they are treated like seeds without an erosion
+      mask_labels = self._seedValues(mask_cc, seeds)
+      void_labels = self._seedValues(void_cc, seeds)
+
+      # bounding box of every mask component, each seed is segmented inside its box
+      stat = seedFilters()[3]
+      stat.Execute(mask_cc)
+      mask_boxes = {label: stat.GetBoundingBox(label) for label in stat.GetLabels()}
+      img_size = img.GetSize()
+      # voxels the level set region extends past the dilated erosion. The propagation 
+      #  term is reversed, so the front only moves outward through curvature and is 
+      #  expected to stay within this margin, a front reaching the border is cut off there
+      ls_margin = 10
+
+      def segmentSeed(id):
+        """
+        Segment the erosion at seed point id inside the bounding box around it,
+        returns (index of the box, erosion image) or None if no erosion is found
+        """
+        (dilate_filter, erode_filter, connected_filter, stat, filter, 
+         distance_filter, ls_filter) = seedFilters()
+
+        point = [seeds[id].tolist()]
         print(point)
 
-        connected_filter = sitk.ConnectedThresholdImageFilter()
-        connected_filter.SetLower(1)
-        connected_filter.SetUpper(1)
-        connected_filter.SetSeedList(point)
-        connected_filter.SetReplaceValue(1)
+        # a seed outside the masked void volume has no component to grow from
+        if (void_labels[id] == 0):
+            print('ERROR: Connected Component did not find erosion at the seed point location of {}'.format(point))
+            return None
 
-        tmp_mask_img = connected_filter.Execute(mask_img)
-        void_volume_img = tmp_mask_img * full_void_volume_img
+        # work on the seed's mask component only, padded so that up to 10 dilations 
+        #  plus the final one stay inside the region
+        box = mask_boxes[int(mask_labels[id])]
+        pad = 12
+        roi_index = [max(0, box[i] - pad) for i in range(3)]
+        roi_size = [min(img_size[i], box[i] + box[i+3] + pad) - roi_index[i] for i in range(3)]
 
-        stat = sitk.LabelShapeStatisticsImageFilter()
+        connected_filter.SetSeedList([(seeds[id] - roi_index).tolist()])
+
+        tmp_mask_img = sitk.Equal(sitk.RegionOfInterest(mask_cc, roi_size, roi_index), int(mask_labels[id]))
+        void_volume_img = tmp_mask_img * sitk.RegionOfInterest(full_void_volume_img, roi_size, roi_index)
 
         x = 0
         l=10
 
-        connected_img = connected_filter.Execute(void_volume_img)
-
-        stat.Execute(connected_img)
-        if(stat.GetNumberOfLabels() == 0):
-            print('ERROR: Connected Component did not find erosion at the seed point location of {}'.format(point))
-            continue
+        connected_img = sitk.Equal(sitk.RegionOfInterest(void_cc, roi_size, roi_index), int(void_labels[id]))
 
-        filter = sitk.SimilarityIndexImageFilter()
         filter.Execute(void_volume_img, connected_img)
 
         if (filter.GetSimilarityIndex() < 0.2):
@@ -457,283 +604,332 @@ class TrainingWidget(ScriptedLoadableModuleWidget):
 
         erode_img = void_volume_img
         
-        break_flag = False
         for i in range(l):
           erode_img = erode_filter.Execute(erode_img)
           connected_img = connected_filter.Execute(erode_img)
           
-          stat.Execute(connected_img)
-          if(stat.GetNumberOfLabels() == 0):
+          # nothing left at the seed, no need to compare the images
+          if not sitk.GetArrayViewFromImage(connected_img).any():
               print('ERROR: Connected Component did not find erosion at the seed point location of {}'.format(point))
-              break_flag = True
+              return None
 
           filter.Execute(erode_img, connected_img)
 
           if (filter.GetSimilarityIndex() < 0.7):
               x = i+1
               break
-            
-        if (break_flag):
-          continue
         
         dilated_img = connected_img
         print("Dilating {} times".format(x))  
         for i in range(x):
             dilated_img = dilate_filter.Execute(dilated_img)
 
-        distance_filter = sitk.SignedMaurerDistanceMapImageFilter()
-        distance_filter.SetInsideIsPositive(True)
-        distance_filter.SetUseImageSpacing(False)
-        distance_filter.SetBackgroundValue(0)
-        distance_img = distance_filter.Execute(dilated_img)
-        distance_img.SetSpacing([1,1,1])
-        feature_img = sitk.Cast(edge, sitk.sitkFloat32)
-        feature_img.SetSpacing([1,1,1])
+        # the mask component usually spans the whole bone, so the distance map and the 
+        #  level set run on the dilated erosion's bounding box plus a margin instead
+        stat.Execute(dilated_img)
+        box = stat.GetBoundingBox(1)
+        ls_index = [max(0, box[i] - ls_margin) for i in range(3)]
+        ls_size = [min(roi_size[i], box[i] + box[i+3] + ls_margin) - ls_index[i] for i in range(3)]
+        ls_dilated_img = sitk.RegionOfInterest(dilated_img, ls_size, ls_index)
+        ls_mask_img = sitk.RegionOfInterest(tmp_mask_img, ls_size, ls_index)
+        # index of the level set region in the full image
+        ls_index = [roi_index[i] + ls_index[i] for i in range(3)]
+        feature_roi = sitk.RegionOfInterest(feature_img, ls_size, ls_index)
+
+        distance_img = distance_filter.Execute(ls_dilated_img)
+        distance_img.CopyInformation(feature_roi)
 
         print("Applying level set filter")
-        ls_filter = sitk.ThresholdSegmentationLevelSetImageFilter()
-        ls_filter.SetLowerThreshold(0)
-        ls_filter.SetUpperThreshold(1)
-        ls_filter.SetMaximumRMSError(0.02)
-        ls_filter.SetNumberOfIterations(500)
-        ls_filter.SetCurvatureScaling(1)
-        ls_filter.SetPropagationScaling(1)
-        ls_filter.SetReverseExpansionDirection(True)
-        ls_img = ls_filter.Execute(distance_img, feature_img)
-
-        ls_img.SetSpacing(img.GetSpacing())
-
-        output_img = sitk.BinaryThreshold(ls_img, lowerThreshold=1, insideValue=1)
-        output_img = (output_img * tmp_mask_img) | dilated_img
+        ls_img = ls_filter.Execute(distance_img, feature_roi)
+
+        # threshold the level set, keep it inside the mask and add the dilated erosion in one pass
+        ls_arr = sitk.GetArrayViewFromImage(ls_img)
+        tmp_mask_arr = sitk.GetArrayViewFromImage(ls_mask_img)
+        dilated_arr = sitk.GetArrayViewFromImage(ls_dilated_img)
+        output_arr = ((ls_arr >= 1) & (tmp_mask_arr != 0)) | (dilated_arr != 0)
+        output_img = sitk.GetImageFromArray(output_arr.astype(np.uint8))
+        output_img.CopyInformation(ls_mask_img)
         output_img = dilate_filter.Execute(output_img)
 
         stat.Execute(output_img)
         num_voxel = stat.GetNumberOfPixels(1)
         print(num_voxel)
 
-        final_img = final_img + output_img * int(id+1)
+        return ls_index, output_img
+
+      # seeds are independent, segment them in parallel and accumulate the labels in seed order
+      with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = [executor.submit(segmentSeed, id) for id in range(num_control_points)]
+        # keep the ui responsive while the workers run
+        while wait(futures, timeout=0.1).not_done:
+          slicer.app.processEvents()
+
+      # labels are written into one array in place instead of adding a scaled volume per seed
+      final_arr = np.zeros(sitk.GetArrayViewFromImage(mask_img).shape, dtype=np.uint8)
+      for id, future in enumerate(futures):
+        result = future.result()
+        if result is None:
+          continue
+        # only the bounding box of the erosion is written, the array is indexed (z,y,x)
+        (x0, y0, z0), output_img = result
+        x1, y1, z1 = [start + size for start, size in zip((x0, y0, z0), output_img.GetSize())]
+        final_arr[z0:z1, y0:y1, x0:x1][sitk.GetArrayViewFromImage(output_img) != 0] = id + 1
         print("Erosion {} found!".format(int(id+1)))
         success = True
+
+      final_img = sitk.GetImageFromArray(final_arr)
+      final_img.CopyInformation(mask_img)
       
-      tempLabelMap = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", 
-                                                      "TemporaryErosionNode")
-      tempLabelMap.CreateDefaultDisplayNodes()
-      tempLabelMap.GetDisplayNode().SetAndObserveColorNodeID(
-        'vtkMRMLColorTableNodeFileGenericColors.txt')
-      tempLabelMap.GetDisplayNode()
+      # temporary label map is kept hidden in the scene, out of saved scenes, and reused on every click
+      tempLabelMap = self._tempLabelMap
+      if tempLabelMap is None or not slicer.mrmlScene.IsNodePresent(tempLabelMap):
+        tempLabelMap = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLLabelMapVolumeNode", 
+                                                        "TemporaryErosionNode")
+        tempLabelMap.SetHideFromEditors(True)
+        tempLabelMap.SetSaveWithScene(False)
+        tempLabelMap.CreateDefaultDisplayNodes()
+        tempLabelMap.GetDisplayNode().SetAndObserveColorNodeID(
+          'vtkMRMLColorTableNodeFileGenericColors.txt')
+        self._tempLabelMap = tempLabelMap
+      # the output may have been deleted from the scene while the workers ran
+      if not slicer.mrmlScene.IsNodePresent(outputVolumeNode):
+        slicer.util.warningDisplay('The output erosion segmentation was removed during the analysis.',
+                                   'Missing Output Erosions')
+        return
       # push result to temporary label map
       sitkUtils.PushVolumeToSlicer(final_img, tempLabelMap)
       # push erosions from temporary label map to output erosion node
       self._logic.labelmapToSegmentationNode(tempLabelMap, outputVolumeNode)
-      # remove temporary label map
-      slicer.mrmlScene.RemoveNode(tempLabelMap)
 
       # success = self._logic.getErosions(inputVolumeNode, inputMaskNode, outputVolumeNode)
-      error_message = ""
-      error_flag = None
-
-      # update widgets
-      erosion_id = outputVolumeNode.GetName()[0]
-      erosion_id = '_'.join(erosion_id)
-      reference_path = None
+      error_message = [] # message parts, joined once before display
 
       print(erosion_id)
-      for reference in os.listdir(self.reference_erosions_dir):
-        if(erosion_id in reference):
-          reference_path = os.path.join(self.reference_erosions_dir, reference)
 
-      if(reference_path):
-        num_control_points = markupsNode.GetNumberOfControlPoints()
-        # vol_map = {}
-        # ref_vol_map = {}
+      # vol_map = {}
+      # ref_vol_map = {}
 
-        num_erosions = 0
-        ref_num_erosions = 0
+      num_erosions = 0
 
-        labels = []
+      erosion_reference, labels_ref, ref_num_erosions = self._loadReference(reference_path)
 
-        erosion_reference = sitk.ReadImage(reference_path)
+      # label map to tell if labeled erosion volume is too small or too big. (False, True)
+      # size_map = {}
+      # compare against the erosions computed above rather than
+      #  re-exporting the output segmentation from the scene
+      erosion = final_img
+      # mapper
+      mapped_labels = {}
 
-        labelShape = sitk.LabelShapeStatisticsImageFilter()
-        labelShape.Execute(erosion_reference)
-        labels_ref = labelShape.GetLabels()
-        
-        for i in labels_ref:
-          # # find volume of each void
-          # ref_vol_map[i] = labelShape.GetNumberOfPixels(i)
-          if(i<=10):
-            ref_num_erosions += 1
-            
-        if success:
-          volumeNode = slicer.mrmlScene.AddNewNodeByClass('vtkMRMLLabelMapVolumeNode')
-          self._logic.exportErosionsToLabelmap(outputVolumeNode, volumeNode) 
-          erosion = sitkUtils.PullVolumeFromSlicer(volumeNode)
-          erosion = final_img
-
-          # labelShape.Execute(erosion)
-          # labels = labelShape.GetLabels()
-          
-          # for i in labels:
-          #   # find volume of each user computed void
-          #   vol_map[i] = labelShape.GetNumberOfPixels(i)  
-
-        # label map to tell if labeled erosion volume is too small or too big. (False, True)
-        # size_map = {}
-        erosion = final_img
-        # mapper
-        mapped_labels = {}
-
-        for i in range(num_control_points):
-          # iterate through placed seed
-          id = int(markupsNode.GetNthControlPointID(i))
-          seed_pos = [round(ax) for ax in self.markupsTableWidget.getNthControlPointIJKCoords(i)]
-
-          print(seed_pos)
-          mapped_labels[id] = None
-          
-          voxel_val = erosion_reference.GetPixel(seed_pos)
-          print(voxel_val)
-          comp_voxel_val = erosion.GetPixel(seed_pos)
-
-          if voxel_val in mapped_labels.values():
-            # duplicate
-            mapped_labels[id] = -1
-            continue
-
-          if voxel_val > 0:
-            if voxel_val > 10:
-              # cyst or vascular channel identified
-              mapped_labels[id] = voxel_val
-            elif comp_voxel_val > 0:
-              # True erosion identified
-              mapped_labels[id] = voxel_val
-              num_erosions += 1
-            else:
-              # failed to find an erosion but the location is correct
-              mapped_labels[id] = 0
+      # sample the reference and the computed erosions at all seed voxels at once
+      voxel_vals = self._seedValues(erosion_reference, seeds)
+      comp_voxel_vals = self._seedValues(erosion, seeds)
 
-        
-        feedback = ""
-        error_flag = num_control_points > num_erosions or num_control_points != ref_num_erosions
-        sim_flag = False
+      identified_labels = set() # reference labels already identified by a seed
+      for id, voxel_val, comp_voxel_val in zip(seed_ids, voxel_vals.tolist(), comp_voxel_vals.tolist()):
+        # iterate through placed seed
+        mapped_labels[id] = None
 
-        filter = sitk.SimilarityIndexImageFilter()
-        success = False
-        if success:
-          erosion = sitk.Cast(erosion, sitk.sitkFloat32)
-          erosion_reference = sitk.Cast(erosion_reference, sitk.sitkFloat32)
+        if voxel_val in identified_labels:
+          # duplicate
+          mapped_labels[id] = -1
+          continue
 
+        if voxel_val > 0:
+          if voxel_val > 10:
+            # cyst or vascular channel identified
+            mapped_labels[id] = voxel_val
+            identified_labels.add(voxel_val)
+          elif comp_voxel_val > 0:
+            # True erosion identified
+            mapped_labels[id] = voxel_val
+            identified_labels.add(voxel_val)
+            num_erosions += 1
+          else:
+            # failed to find an erosion but the location is correct
+            mapped_labels[id] = 0
+
+      
+      feedback = []
+      error_flag = num_control_points > num_erosions or num_control_points != ref_num_erosions
+      sim_flag = False
+
+      if success:
+        # the overlap filter needs both label maps on one grid,
+        #  label maps from the same scan already share it
+        if not self._sameGeometry(erosion, erosion_reference):
           resampler = sitk.ResampleImageFilter()
           resampler.SetReferenceImage(erosion_reference)
-          resampler.SetInterpolator(sitk.sitkLinear)
+          resampler.SetInterpolator(sitk.sitkNearestNeighbor)
           resampler.SetDefaultPixelValue(0)
           resampler.SetTransform(sitk.Transform())
           erosion = resampler.Execute(erosion)
 
-        for i in range(num_control_points):
-          label = int(markupsNode.GetNthControlPointID(i))
-
-          feedback += "\nFeedback for Seed #{}:\n".format(i+1)
+      # relabel each matched reference erosion with the label of its seed point,
+      #  so the similarity index of every erosion comes out of one overlap pass
+      matched_labels = {ref_label: label for label, ref_label in mapped_labels.items()
+                        if ref_label is not None and 0 < ref_label <= 10}
+      if matched_labels:
+        change_map = {ref_label: matched_labels.get(ref_label, 0) for ref_label in labels_ref}
+        matched_reference = sitk.ChangeLabel(erosion_reference, changeMap=change_map)
+        matched_reference = sitk.Cast(matched_reference, erosion.GetPixelID())
+        overlap_filter = sitk.LabelOverlapMeasuresImageFilter()
+        overlap_filter.Execute(erosion, matched_reference)
+
+      for i, label in enumerate(seed_ids):
+        feedback.append("\nFeedback for Seed #{}:\n".format(i+1))
+
+        if(mapped_labels[label] is None):
+          sim_flag = True
+          error_flag = True
+          feedback.append("No pathological or physiological breaks should exist at this location. Please remove/relocate this seed point.\n")
+        elif(mapped_labels[label] == -1):
+          sim_flag = True
+          feedback.append("Seedpoint identifies the same erosion identified by another erosion.")
+        elif(mapped_labels[label] == 0):
+          error_flag = True
+          feedback.append("No erosion was detected at this location. But an erosion location was correctly identified.")
+          feedback.append("- Reposition seed point to be located deeper into the erosion.\n")
+          feedback.append("- Make sure the seed point is located within the mask.")
+        elif(mapped_labels[label] > 10):
+          error_flag = True
+          sim_flag = True
+          feedback.append("You have attempted to identify a cyst (non-erosion pathological feature). No erosions exist at this location.\n")
+          feedback.append("Please remove/relocate this seed point.")
+        elif(mapped_labels[label] > 20):
+          error_flag = True
+          sim_flag = True
+          feedback.append("You have attempted to identify a vascular channel (physiological feature). No erosions exist at this location.\n")
+          feedback.append("Please remove/relocate this seed point.")
+        else:
+          similarity_index = overlap_filter.GetDiceCoefficient(label)
 
-          if(mapped_labels[label] is None):
-            sim_flag = True
-            error_flag = True
-            feedback += "No pathological or physiological breaks should exist at this location. Please remove/relocate this seed point.\n"
-          elif(mapped_labels[label] == -1):
-            sim_flag = True
-            feedback += "Seedpoint identifies the same erosion identified by another erosion."
-          elif(mapped_labels[label] == 0):
-            error_flag = True
-            feedback += "No erosion was detected at this location. But an erosion location was correctly identified."
-            feedback += "- Reposition seed point to be located deeper into the erosion.\n"
-            feedback += "- Make sure the seed point is located within the mask."
-          elif(mapped_labels[label] > 10):
-            error_flag = True
-            sim_flag = True
-            feedback += "You have attempted to identify a cyst (non-erosion pathological feature). No erosions exist at this location.\n"
-            feedback += "Please remove/relocate this seed point."
-          elif(mapped_labels[label] > 20):
-            error_flag = True
-            sim_flag = True
-            feedback += "You have attempted to identify a vascular channel (physiological feature). No erosions exist at this location.\n"
-            feedback += "Please remove/relocate this seed point."
+          feedback.append(f"Similarity index to refence: {similarity_index*100:.3f}%\n")
+          if similarity_index > 0.9:
+            feedback.append("Correctly identified erosion!\n")
           else:
-            bin_erosion = erosion == label
-            bin_erosion_ref = erosion_reference == mapped_labels[label]
-
-            filter.Execute(bin_erosion, bin_erosion_ref)
-            similarity_index = filter.GetSimilarityIndex()
-
-            feedback += "Similarity index to refence: {0:.3f}%\n".format(similarity_index*100)
-            if similarity_index > 0.9:
-              feedback += "Correctly identified erosion!\n"
-            else:
-              error_flag = True
-              
-              feedback += "Erosions exists at this location but further actions needed to improve results:\n"
-              feedback += "- Reposition seed point to be located deeper within the erosion.\n"
+            error_flag = True
+            
+            feedback.append("Erosions exists at this location but further actions needed to improve results:\n")
+            feedback.append("- Reposition seed point to be located deeper within the erosion.\n")
 
-          feedback += "\n"
+        feedback.append("\n")
 
-        if error_flag:
-          error_message += "Error!\n\n"
-          
-          if(num_erosions == 0):
-            error_message += "No erosions detected at any placed seed point/s.\n"
+      if error_flag:
+        error_message.append("Error!\n\n")
+        
+        if(num_erosions == 0):
+          error_message.append("No erosions detected at any placed seed point/s.\n")
 
-          elif(num_control_points > num_erosions):
-            error_message += "Erosions were not detected at all placed seed point/s.\n"
+        elif(num_control_points > num_erosions):
+          error_message.append("Erosions were not detected at all placed seed point/s.\n")
 
-          if(num_control_points == ref_num_erosions):
-            if(sim_flag):
-              error_message += "Correct number of seed points placed, but the locations are incorrect. See below for feedback on each placed seed point.\n" 
-            else:
-              error_message += "Correct number of seed points placed. See below for feedback on each placed seed point.\n"
+        if(num_control_points == ref_num_erosions):
+          if(sim_flag):
+            error_message.append("Correct number of seed points placed, but the locations are incorrect. See below for feedback on each placed seed point.\n")
+          else:
+            error_message.append("Correct number of seed points placed. See below for feedback on each placed seed point.\n")
 
-          if(num_control_points > ref_num_erosions):
-            error_message += "Too many seed points were placed. Only {} point/s needed. Delete {} point/s.\n".format(ref_num_erosions, num_control_points-ref_num_erosions)
-          
-          if(num_control_points < ref_num_erosions):
-            error_message += "Less seed points were placed than the number of erosions that exist in the reference. Please place {} more seed point/s.\n".format(ref_num_erosions - num_control_points)
-        else:
-          error_message += "Success!\n"
+        if(num_control_points > ref_num_erosions):
+          error_message.append("Too many seed points were placed. Only {} point/s needed. Delete {} point/s.\n".format(ref_num_erosions, num_control_points-ref_num_erosions))
+        
+        if(num_control_points < ref_num_erosions):
+          error_message.append("Less seed points were placed than the number of erosions that exist in the reference. Please place {} more seed point/s.\n".format(ref_num_erosions - num_control_points))
+      else:
+        error_message.append("Success!\n")
 
-        error_message += "\n"
+      error_message.append("\n")
 
-        error_message += feedback
+      error_message.extend(feedback)
 
       self.outputErosionSelector.setCurrentNodeID("") # reset the output volume selector
 
+      error_message = ''.join(error_message)
       if(error_flag):
         slicer.util.errorDisplay(error_message, 'Incorrect Erosion Analysis')
       else:
         slicer.util.infoDisplay(error_message, 'Seed Point Feedback')
 
-    # update widgets
-    self.enableErosionsWidgets()
-
     self.logger.info("Finished\n")
 
+  def _loadReference(self, reference_path):
+    """
+    Read a reference erosion segmentation and its labels. 
+    References do not change, so the result is cached by path.
+
+    Returns:
+      tuple: the reference image, its labels, and the number of erosions (labels 1 to 10)
+    """
+    if reference_path not in self._referenceCache:
+      erosion_reference = sitk.ReadImage(reference_path)
+
+      # only the labels are needed, skip the optional shape measures
+      labelShape = sitk.LabelShapeStatisticsImageFilter()
+      labelShape.ComputeFeretDiameterOff()
+      labelShape.ComputePerimeterOff()
+      labelShape.ComputeOrientedBoundingBoxOff()
+      labelShape.Execute(erosion_reference)
+      labels_ref = labelShape.GetLabels()
+
+      # labels above 10 are cysts or vascular channels
+      ref_num_erosions = sum(1 for i in labels_ref if i <= 10)
+
+      self._referenceCache[reference_path] = (erosion_reference, labels_ref, ref_num_erosions)
+    return self._referenceCache[reference_path]
+
+  def _seedValues(self, img, seeds):
+    """
+    Sample an image at all seed voxels with one gather.
+
+    Args:
+      img (Image)
+      seeds (ndarray): array of int with one (i, j, k) row per seed
+
+    Returns:
+      ndarray: the voxel value at every seed, 0 for seeds outside the image
+    """
+    # negative indices would wrap around instead of failing, mask them out first
+    inside = np.all((seeds >= 0) & (seeds < np.array(img.GetSize())), axis=1)
+    safe_seeds = np.where(inside[:,None], seeds, 0)
+    # numpy arrays are indexed (z, y, x)
+    values = sitk.GetArrayViewFromImage(img)[safe_seeds[:,2], safe_seeds[:,1], safe_seeds[:,0]]
+    return np.where(inside, values, 0)
+
+  def _sameGeometry(self, img1, img2):
+    """Return True if both images have the same size, spacing, origin and direction"""
+    return (img1.GetSize() == img2.GetSize() and
+            img1.GetSpacing() == img2.GetSpacing() and
+            img1.GetOrigin() == img2.GetOrigin() and
+            img1.GetDirection() == img2.GetDirection())
+
   def onRevealSeedPointsButton(self):
-    image_id = self.inputVolumeSelector.currentNode().GetName()[0]
+    image_id = self._scanId(self.inputVolumeSelector.currentNode().GetName())
 
-    for markup in os.listdir(self.seed_points_dir):
-      if not (image_id in markup):
-        continue
-      markup = os.path.join(self.seed_points_dir, markup)
+    for markup in self._seed_index.get(image_id, []):
       markupsNode = slicer.util.loadMarkups(markup)
       self.markupsTableWidget.getMarkupsSelector().setCurrentNode(markupsNode)
 
   def enableErosionsWidgets(self):
     """Enable widgets in the erosions layout in step 4"""
+    self.setErosionsInputsEnabled(True)
     self.checkErosionsButton()
     self.progressBar.hide()
 
   def disableErosionsWidgets(self):
     """Disable widgets in the erosions layout in step 4"""
+    # the nodes must not be switched or removed while erosions are computed
+    self.setErosionsInputsEnabled(False)
     self.getErosionsButton.enabled = False
+    self.revealSeedPointsButton.enabled = False
     self.progressBar.show()
 
+  def setErosionsInputsEnabled(self, enabled):
+    """Enable or disable the node selectors and seed point table in step 4"""
+    self.inputVolumeSelector.enabled = enabled
+    self.inputMaskSelector.enabled = enabled
+    self.outputErosionSelector.enabled = enabled
+    self.markupsTableWidget.setEnabled(enabled)
+
   def setProgress(self, value):
     """Update the progress bar"""
     self.progressBar.setValue(value)
@@ -1,5 +1,6 @@
 import os
 import vtk, qt, ctk, slicer
+import numpy as np
 
 CONTROL_POINT_LABEL_COLUMN = 0
 CONTROL_POINT_BONE = 1
@@ -26,9 +27,12 @@ class MarkupsTable:
     self._mrmlScene = None
     self._currentNode = None
     self._currentNodeObservers = []
+    self._enabled = True
+    self._lockState = None # (node, locked) saved while the table is disabled
     self._logic = MarkupsTableLogic()
     self._ras2ijk = vtk.vtkMatrix4x4()
     self._ijk2ras = vtk.vtkMatrix4x4()
+    self._ras2ijkArray = np.eye(4) # numpy copy of _ras2ijk for batched conversions
     self.advanced = False
 
     if not parent:
@@ -152,6 +156,20 @@ class MarkupsTable:
     
     return IJKCoord
 
+  def getControlPointsIJKCoords(self):
+    """
+    Convert all control points of the current node to rounded IJK coordinates
+    with a single matrix multiplication.
+
+    Returns:
+      ndarray: array of int with one (i, j, k) row per control point
+    """
+    ras = slicer.util.arrayFromMarkupsControlPoints(self._currentNode).reshape(-1, 3)
+    ras2ijk = self._ras2ijkArray
+    ijk = ras @ ras2ijk[:3,:3].T + ras2ijk[:3,3]
+
+    return np.round(ijk).astype(int)
+
   def onMarkupsControlPointSelected(self, row, column):
     """Run this whenever a markup control point in the table is selected"""
     for i in range(self.markupsControlPointsTableWidget.rowCount):
@@ -308,6 +326,23 @@ class MarkupsTable:
   def getMarkupsSelector(self):
     return self.markupsSelector
 
+  def setEnabled(self, enabled):
+    """Enable or disable the selector, place buttons and table, the points are locked while disabled"""
+    self._enabled = enabled
+    self.markupsSelector.enabled = enabled
+    self.markupsControlPointsTableWidget.enabled = enabled
+    self.markupsPlaceWidget.setEnabled(enabled and self._currentNode is not None)
+    self.deleteAllButton.enabled = enabled and self._currentNode is not None
+
+    # stop the points from being dragged in the slice views, then restore the previous lock
+    if not enabled and self._currentNode and self._lockState is None:
+      self._lockState = (self._currentNode, self._currentNode.GetLocked())
+      self._currentNode.SetLocked(True)
+    elif enabled and self._lockState is not None:
+      node, locked = self._lockState
+      node.SetLocked(locked)
+      self._lockState = None
+
   def setJumpToSliceEnabled(self, enable):
     self.jumpToSliceEnabled = enable
   
@@ -352,6 +387,7 @@ class MarkupsTable:
   def setCoordsMatrices(self, ras2ijk, ijk2ras):
     self._ras2ijk = ras2ijk
     self._ijk2ras = ijk2ras
+    self._ras2ijkArray = slicer.util.arrayFromVTKMatrix(ras2ijk)
 
   def advancedMarkupsControlPointsTableView(self):
     """Change the table view to show and allow edits of Minimum Erosion Radius and Dilate/Erode Distance parameters"""
@@ -453,8 +489,8 @@ class MarkupsTable:
       self.deleteAllButton.enabled = False
       return
     
-    self.markupsPlaceWidget.setEnabled(True)
-    self.deleteAllButton.enabled = True
+    self.markupsPlaceWidget.setEnabled(self._enabled)
+    self.deleteAllButton.enabled = self._enabled
 
     # Update the control points table
     wasBlockedTableWidget = self.markupsControlPointsTableWidget.blockSignals(True)
@@ -31,6 +31,7 @@
 #
 #-----------------------------------------------------
 import SimpleITK as sitk
+import numpy as np
 
 class VoidVolumeLogic:
     def __init__(self, img=None, mask=None, edge_detection=4200, levelset=4000, sigma=1,
@@ -386,10 +387,18 @@ class VoidVolumeLogic:
         thresh_img = sitk.BinaryThreshold(mask_img, lowerThreshold=1, insideValue=1)
 
         # bounding box cut
-        lss_filter = sitk.LabelStatisticsImageFilter()
-        lss_filter.Execute(thresh_img, thresh_img)
-        bounds = lss_filter.GetBoundingBox(1)
-        xmin_crop, xmax, ymin_crop, ymax, zmin_crop, zmax = bounds
+        #  from projections of the binary mask instead of a label statistics pass,
+        #  the array is indexed (z,y,x) and the max bounds are inclusive
+        thresh_arr = sitk.GetArrayViewFromImage(thresh_img)
+        zy_any = thresh_arr.any(axis=2)
+        z_index = np.flatnonzero(zy_any.any(axis=1))
+        y_index = np.flatnonzero(zy_any.any(axis=0))
+        x_index = np.flatnonzero(thresh_arr.any(axis=(0,1)))
+        if len(x_index) == 0:
+            raise ValueError('The mask is empty.')
+        xmin_crop, xmax = int(x_index[0]), int(x_index[-1])
+        ymin_crop, ymax = int(y_index[0]), int(y_index[-1])
+        zmin_crop, zmax = int(z_index[0]), int(z_index[-1])
         xmin_crop = round(xmin_crop) 
         ymin_crop = round(ymin_crop) 
         zmin_crop = round(zmin_crop) 
@@ -416,8 +425,6 @@ class VoidVolumeLogic:
         direction = self.model_img.GetDirection()
 
         # crop bone model
-        model_img = sitk.Image(width, height, depth, self.model_img.GetPixelID())
-        model_img.CopyInformation(self.mask_img)
         destination_x = round((model_origin[0] - mask_origin[0]) / spacing)
         destination_y = round((model_origin[1] - mask_origin[1]) / spacing)
         destination_z = round((model_origin[2] - mask_origin[2]) / spacing)
@@ -426,23 +433,33 @@ class VoidVolumeLogic:
         r.SetMatrix(direction)
         destination_index = r.TransformPoint((destination_x, destination_y, destination_z))
         destination_index = (round(destination_index[0]), round(destination_index[1]), round(destination_index[2]))
-        paste_filter = sitk.PasteImageFilter()
-        paste_filter.SetDestinationIndex(destination_index)
-        paste_filter.SetSourceSize(model_size)
-        self.model_img = paste_filter.Execute(model_img, self.model_img)
+        source_index = [-index for index in destination_index]
+        if all(0 <= index and index + size <= model_length for index, size, model_length 
+               in zip(source_index, (width, height, depth), model_size)):
+            # the model covers the whole mask, so take that region directly
+            model_img = sitk.RegionOfInterest(self.model_img, [width, height, depth], source_index)
+            model_img.CopyInformation(self.mask_img)
+            self.model_img = model_img
+        else:
+            # paste the model into an empty image, the rest of the mask is left at 0
+            model_img = sitk.Image(width, height, depth, self.model_img.GetPixelID())
+            model_img.CopyInformation(self.mask_img)
+            paste_filter = sitk.PasteImageFilter()
+            paste_filter.SetDestinationIndex(destination_index)
+            paste_filter.SetSourceSize(model_size)
+            self.model_img = paste_filter.Execute(model_img, self.model_img)
         
         # update seed points
         destination_x *= int(direction[0])
         destination_y *= int(direction[4])
         destination_z *= int(direction[8])
-        self._seeds_crop = [(seed[0]+destination_x, seed[1]+destination_y, seed[2]+destination_z)
-                            for seed in self.seeds]
-        for i, seed in reversed(list(enumerate(self._seeds_crop))):
-            is_in_range = ((0 <= seed[0] < width) and 
-                           (0 <= seed[1] < height) and 
-                           (0 <= seed[2] < depth))
-            if not is_in_range:
-                self._removeNthSeed(i)
+        # shift all seed points at once and keep the ones inside the cropped model
+        seeds_crop = np.array(self.seeds, dtype=int).reshape(-1, 3)
+        seeds_crop += [destination_x, destination_y, destination_z]
+        is_in_range = np.all((seeds_crop >= 0) & (seeds_crop < [width, height, depth]), axis=1)
+        self._seeds_crop = [tuple(seed) for seed in seeds_crop[is_in_range].tolist()]
+        self.seeds[:] = [seed for seed, keep in zip(self.seeds, is_in_range) if keep]
+        self.erosionIds[:] = [erosionId for erosionId, keep in zip(self.erosionIds, is_in_range) if keep]
 
     def setThresholds(self, edge_detection_threshold, levelset_threshold):
         """